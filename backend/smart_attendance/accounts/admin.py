@@ -1,43 +1,49 @@
 from django.contrib import admin
-from .models import Student, Department, Batch, ClassGroup
+from .models import Student, Department, Batch, ClassGroup, FaceChip, FaceReference
 from django.contrib import messages
-import numpy as np
+from django.utils.html import format_html
+import base64
+
+class FaceReferenceInline(admin.TabularInline):
+    model = FaceReference
+    fields = ('source', 'distance', 'created_at')
+    readonly_fields = ('source', 'distance', 'created_at')
+    extra = 0
+    can_delete = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 class StudentAdmin(admin.ModelAdmin):
     list_display = ('roll_no', 'name', 'created_at', 'face_encoding_display')
     search_fields = ('roll_no', 'name')
-    list_filter = ('created_at',)
+    list_filter = ('has_face_encoding', 'created_at')
     exclude = ('qr_code',)
-    readonly_fields = ('face_encoding_display',)
+    readonly_fields = ('face_encoding_display', 'face_chip_preview')
+    inlines = (FaceReferenceInline,)
 
-    def face_encoding_display(self, obj):
-        if not obj.face_encoding or obj.face_encoding == b'':
-            return " No encoding (attendance will not work)"
-        
-        try:
-            arr = np.frombuffer(obj.face_encoding, dtype=np.float64)
-            if np.all(arr == 0):
-                return " Default empty encoding (zeros). Upload image to fix."
-        except:
-            pass
+    def get_queryset(self, request):
+        # The changelist only needs the indexed flag, not the encoding blobs
+        return super().get_queryset(request).defer('face_encoding')
 
-        if hasattr(obj, 'has_valid_encoding') and not obj.has_valid_encoding:
-            return " Invalid encoding (not 128-dim float64)"
-        return f" Encoding present ({len(obj.face_encoding)} bytes)"
+    def face_encoding_display(self, obj):
+        if not obj.has_face_encoding:
+            return " No usable encoding (attendance will not work). Upload image to fix."
+        return " Encoding present"
 
     face_encoding_display.short_description = "Face encoding status"
 
+    def face_chip_preview(self, obj):
+        stored = FaceChip.objects.filter(student=obj).first() if obj.pk else None
+        if stored is None:
+            return "No face chip (registered before chips were stored)"
+        data = base64.b64encode(bytes(stored.chip)).decode()
+        return format_html('<img src="data:image/png;base64,{}" width="150" height="150">', data)
+
+    face_chip_preview.short_description = "Aligned face chip"
+
     def save_model(self, request, obj, form, change): 
-        is_default = False
-        if obj.face_encoding:
-             try:
-                 arr = np.frombuffer(obj.face_encoding, dtype=np.float64)
-                 if np.all(arr == 0):
-                     is_default = True
-             except:
-                 pass
-
-        if not obj.image and (not obj.face_encoding or obj.face_encoding == b'' or is_default):
+        if not obj.image and not obj.has_face_encoding:
             messages.warning(request, " No image provided. Face encoding cannot be generated automatically.")
         
         super().save_model(request, obj, form, change)
@@ -1,24 +1,72 @@
+import os
+
 from django.core.management.base import BaseCommand
-from accounts.models import Student
-from attendance.utils.face_utils import get_face_encoding
+from django.db.models import Q
+
+from accounts.models import Student, current_encoder_version
+from attendance.utils import gallery
+from attendance.utils.reembed import (
+    Checkpoint, Progress, encode_students, run_chunks, student_chunks, write_encodings,
+)
+
+
+def invalid_encoding_students():
+    """Students whose face_encoding is missing, empty, the all-zeros
+    default_encoding() placeholder, or not a 128-dim float64 blob
+    (an index lookup on has_face_encoding; no blob is read)."""
+    return Student.objects.filter(has_face_encoding=False)
+
 
 class Command(BaseCommand):
-    help = "Generate missing face encodings for students with images"
-
-    def handle(self, *args, **kwargs):
-        fixed = 0
-        for student in Student.objects.filter(face_encoding__isnull=True).exclude(image=''):
-            print(f"Processing {student.roll_no} ({student.name})...")
-            encoding = get_face_encoding(student.image.path)
-            if encoding:
-                student.face_encoding = encoding
-                student.save()
-                print(f"  -> Face encoding set.")
-                fixed += 1
-            else:
-                print(f"  -> No face found in image.")
-        print(f"Done. Fixed {fixed} students.")
-
-# Usage: python manage.py fix_face_encodings
-# This will generate encodings for students who have an image but no encoding.
-# Make sure the image is a clear, frontal face.
+    help = "Generate face encodings for every student with an image but no usable encoding"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100)
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Encoding processes (default: CPU count; 0 runs inline)",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be fixed")
+
+    def handle(self, *args, **opts):
+        checkpoint = Checkpoint("fix_face_encodings")
+        after = 0 if opts["restart"] else checkpoint.load()
+        invalid = invalid_encoding_students()
+        has_photo = Q(image__isnull=False) & ~Q(image="")
+        fixable = invalid.filter(Q(face_chip__isnull=False) | has_photo).filter(id__gt=after)
+        total = fixable.count()
+        self.stdout.write(
+            f"{invalid.count()} students without a usable encoding, {total} with a photo or chip to fix"
+            + (f" (resuming after id {after})" if after else "")
+        )
+        if opts["dry_run"] or not total:
+            return
+
+        workers = opts["workers"]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        chunk_size = opts["chunk_size"]
+        version = current_encoder_version()
+
+        progress = Progress(total, self.stdout.write)
+
+        def on_result(last_id, results):
+            write_encodings(last_id, results, version, checkpoint, progress)
+
+        run_chunks(encode_students, student_chunks(fixable, chunk_size), workers, on_result)
+
+        fixed = progress.done - progress.failed
+        if fixed:
+            gallery.invalidate()
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Fixed {fixed} of {progress.done} students "
+            f"({progress.failed} without a detectable face) "
+            f"at {progress.rate:.1f} students/s"
+        ))
+
+# Usage: python manage.py fix_face_encodings [--workers N] [--chunk-size N] [--restart] [--dry-run]
+# Finds students whose encoding is missing, empty, all zeros or malformed and
+# encodes them from their stored face chip, or else from their photo. Safe to
+# interrupt: rerunning resumes after the last finished chunk.
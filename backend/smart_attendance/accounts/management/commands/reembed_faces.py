@@ -0,0 +1,84 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import FaceReference, Student, current_encoder_version
+from attendance.utils import gallery
+from attendance.utils.reembed import (
+    Checkpoint, Progress, encode_students, run_chunks, student_chunks, write_encodings,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encode every student whose face_encoding was produced by another encoder "
+        "version (settings.FACE_ENCODER_VERSION). Resumable: rerun after an interruption."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100)
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Encoding processes (default: CPU count; 0 runs inline)",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many students")
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+        parser.add_argument(
+            "--publish-every", type=float, default=60,
+            help="Seconds between encoding store exports, so re-embedded students become matchable",
+        )
+        parser.add_argument(
+            "--keep-stale-references", action="store_true",
+            help="Keep FaceReference rows of other versions (they have no photo to re-encode from)",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        target = current_encoder_version()
+        checkpoint = Checkpoint("reembed_faces", target)
+        after = 0 if opts["restart"] else checkpoint.load()
+        stale = (
+            Student.objects.exclude(encoding_version=target)
+            .filter(id__gt=after)
+            .order_by("id")
+        )
+        total = stale.count()
+        if opts["limit"] is not None:
+            total = min(total, opts["limit"])
+        stale_refs = FaceReference.objects.exclude(encoding_version=target)
+        self.stdout.write(
+            f"Encoder version {target}: {total} students to re-embed"
+            + (f" (resuming after id {after})" if after else "")
+            + f", {stale_refs.count()} stale references"
+        )
+        if opts["dry_run"] or not total:
+            return
+
+        workers = opts["workers"]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        chunk_size = opts["chunk_size"]
+
+        progress = Progress(total, self.stdout.write)
+        state = {"published": time.monotonic()}
+
+        def on_result(last_id, results):
+            write_encodings(last_id, results, target, checkpoint, progress)
+            if time.monotonic() - state["published"] >= opts["publish_every"]:
+                # Make the students re-embedded so far matchable
+                gallery.invalidate()
+                state["published"] = time.monotonic()
+
+        run_chunks(encode_students, student_chunks(stale, chunk_size, limit=total), workers, on_result)
+
+        if not opts["keep_stale_references"]:
+            deleted, _ = stale_refs.delete()
+            self.stdout.write(f"Deleted {deleted} stale references")
+        gallery.invalidate()
+        if opts["limit"] is None:
+            checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-embedded {progress.done - progress.failed} students "
+            f"({progress.failed} without a usable face) at {progress.rate:.1f} students/s"
+        ))
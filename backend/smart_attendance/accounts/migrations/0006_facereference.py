@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_batch_department_alter_student_face_encoding_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encoding', models.BinaryField()),
+                ('source', models.CharField(choices=[('registration', 'Registration'), ('checkin', 'Check-in')], default='registration', max_length=20)),
+                ('distance', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='face_references', to='accounts.student')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
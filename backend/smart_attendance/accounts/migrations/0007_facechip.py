@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_facereference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceChip',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='face_chip', serialize=False, to='accounts.student')),
+                ('chip', models.BinaryField()),
+                ('landmarks', models.JSONField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
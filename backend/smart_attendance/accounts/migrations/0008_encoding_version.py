@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:56
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_facechip'),
+    ]
+
+    operations = [
+        # Existing rows were encoded by the baseline model, whatever
+        # FACE_ENCODER_VERSION is set to when this migration runs
+        migrations.AddField(
+            model_name='facereference',
+            name='encoding_version',
+            field=models.CharField(default='dlib-resnet-v1', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='encoding_version',
+            field=models.CharField(default='dlib-resnet-v1', max_length=32),
+        ),
+        # New rows get the configured version
+        migrations.AlterField(
+            model_name='facereference',
+            name='encoding_version',
+            field=models.CharField(default=accounts.models.current_encoder_version, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='encoding_version',
+            field=models.CharField(default=accounts.models.current_encoder_version, max_length=32),
+        ),
+    ]
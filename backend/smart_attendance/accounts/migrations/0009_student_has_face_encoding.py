@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:57
+
+import numpy as np
+from django.db import migrations, models
+
+
+def backfill_has_face_encoding(apps, schema_editor):
+    # One pass over the blobs so nothing has to read them again to ask
+    # "does this student have a usable encoding?"
+    Student = apps.get_model("accounts", "Student")
+    valid = []
+    rows = Student.objects.values_list("id", "face_encoding").iterator(chunk_size=2000)
+    for pk, blob in rows:
+        if blob and len(blob) == 128 * 8 and np.frombuffer(bytes(blob), dtype=np.float64).any():
+            valid.append(pk)
+    for start in range(0, len(valid), 2000):
+        Student.objects.filter(id__in=valid[start:start + 2000]).update(has_face_encoding=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_encoding_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='has_face_encoding',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_has_face_encoding, migrations.RunPython.noop),
+    ]
@@ -30,6 +30,21 @@ def default_encoding():
     return np.zeros(128, dtype=np.float64).tobytes()
 
 
+def encoding_is_valid(blob):
+    # True for a 128-dim float64 encoding that is not the all-zeros default
+    if not blob or len(blob) != 128 * 8:
+        return False
+    return bool(np.frombuffer(bytes(blob), dtype=np.float64).any())
+
+
+def current_encoder_version():
+    # Identifies the pipeline that produced an encoding (detector, landmarks,
+    # descriptor model, jitters); vectors of different versions are not comparable
+    from django.conf import settings
+
+    return getattr(settings, "FACE_ENCODER_VERSION", "dlib-resnet-v1")
+
+
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
@@ -68,6 +83,10 @@ class Student(models.Model):
     )
     # Default to 128-dim zero vector
     face_encoding = models.BinaryField(default=default_encoding, null=True, blank=True)
+    encoding_version = models.CharField(max_length=32, default=current_encoder_version)
+    # Denormalised encoding_is_valid(face_encoding), kept in sync by save() (and by the
+    # bulk repair commands) so "who is missing an encoding" never reads the blobs
+    has_face_encoding = models.BooleanField(default=False, db_index=True)
     image = models.ImageField(
         upload_to=student_image_upload_path, null=True, blank=True
     )
@@ -76,14 +95,8 @@ class Student(models.Model):
 
     @property
     def has_valid_encoding(self):
-        # Returns True if face_encoding is a valid 128-dim float64 vector AND not just zeros
-        if not self.face_encoding:
-            return False
-        try:
-            arr = np.frombuffer(self.face_encoding, dtype=np.float64)
-            return arr.shape == (128,) and not np.all(arr == 0)
-        except:
-            return False
+        # True if face_encoding is a valid 128-dim float64 vector AND not just zeros
+        return self.has_face_encoding
 
     def clean(self):
         if Student.objects.exclude(pk=self.pk).filter(roll_no=self.roll_no).exists():
@@ -99,34 +112,34 @@ class Student(models.Model):
             qr_img.save(buffer, format="PNG")
             self.qr_code.save(f"{self.roll_no}_qr.png", File(buffer), save=False)
 
+        # Keep the indexed flag in step with the encoding being written
+        self.has_face_encoding = encoding_is_valid(self.face_encoding)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "face_encoding" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "has_face_encoding"}
+
         # 2. Save first to ensure image is on disk
         super().save(*args, **kwargs)
 
         # 3. Auto-generate Face Encoding if image exists but encoding is missing or default (zeros)
-        is_default_or_empty = False
-        if not self.face_encoding or self.face_encoding == b"":
-            is_default_or_empty = True
-        else:
+        if self.image and not self.has_face_encoding:
             try:
-                arr = np.frombuffer(self.face_encoding, dtype=np.float64)
-                if np.all(arr == 0):
-                    is_default_or_empty = True
-            except:
-                is_default_or_empty = True
-
-        if self.image and is_default_or_empty:
-            try:
-                from attendance.utils.face_utils import get_face_encoding
+                from attendance.utils import face_worker
+                from attendance.utils.face_utils import get_face_registration
 
                 print(f"Auto-generating face encoding for {self.roll_no} from image...")
 
-                # self.image.path is available because we called super().save() above
-                encoding = get_face_encoding(self.image.path)
+                # self.image.path is available because we called super().save() above;
+                # detection/encoding runs in the face worker pool, not this thread
+                encoding, chip, landmarks = face_worker.run(get_face_registration, self.image.path)
 
                 if encoding:
                     self.face_encoding = encoding
+                    self.encoding_version = current_encoder_version()
+                    self.has_face_encoding = encoding_is_valid(encoding)
                     # Save only the face_encoding field to update the DB record
-                    super().save(update_fields=["face_encoding"])
+                    super().save(update_fields=["face_encoding", "encoding_version", "has_face_encoding"])
+                    FaceChip.store(self, chip, landmarks)
                     print(f"Successfully saved encoding for {self.roll_no}")
                 else:
                     print(f"Warning: No face found in image for {self.roll_no}")
@@ -135,3 +148,98 @@ class Student(models.Model):
 
     def __str__(self):
         return f"{self.roll_no} - {self.name}"
+
+
+class FaceReference(models.Model):
+    """Extra reference encoding for a student, on top of Student.face_encoding.
+
+    Stored as float32 (512 bytes) to keep the per-student set compact. Extra
+    registration photos add "registration" references; confident check-ins may
+    top up a bounded buffer of "checkin" references (see add_checkin).
+    """
+
+    SOURCE_CHOICES = [
+        ("registration", "Registration"),
+        ("checkin", "Check-in"),
+    ]
+    DTYPE = np.float32
+
+    student = models.ForeignKey(
+        Student, on_delete=models.CASCADE, related_name="face_references"
+    )
+    encoding = models.BinaryField()
+    encoding_version = models.CharField(max_length=32, default=current_encoder_version)
+    source = models.CharField(
+        max_length=20, choices=SOURCE_CHOICES, default="registration"
+    )
+    # Distance to the student's references when captured (check-in top-ups only)
+    distance = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    @classmethod
+    def pack(cls, encoding):
+        # Accepts float64 bytes (as returned by get_face_encoding) or an array
+        if isinstance(encoding, (bytes, bytearray, memoryview)):
+            encoding = np.frombuffer(bytes(encoding), dtype=np.float64)
+        return np.asarray(encoding, dtype=cls.DTYPE).tobytes()
+
+    @classmethod
+    def add_checkin(cls, student, encoding, distance):
+        """Keep a confident check-in encoding as an extra reference.
+
+        Only distances up to FACE_REFERENCE_TOPUP_DISTANCE are kept, and at most
+        FACE_MAX_CHECKIN_REFERENCES per student (oldest dropped first).
+        """
+        from django.conf import settings
+
+        if distance is None or distance > getattr(
+            settings, "FACE_REFERENCE_TOPUP_DISTANCE", 0.4
+        ):
+            return None
+        ref = cls.objects.create(
+            student=student,
+            encoding=cls.pack(encoding),
+            source="checkin",
+            distance=distance,
+        )
+        limit = getattr(settings, "FACE_MAX_CHECKIN_REFERENCES", 5)
+        stale = cls.objects.filter(student=student, source="checkin").order_by(
+            "-created_at", "-id"
+        ).values_list("id", flat=True)[limit:]
+        cls.objects.filter(id__in=list(stale)).delete()
+        return ref
+
+    def __str__(self):
+        return f"{self.student.roll_no} ({self.source})"
+
+
+class FaceChip(models.Model):
+    """Aligned 150x150 face chip (PNG) of a student's registration photo.
+
+    Kept with the 5-point landmarks it was cut with, so re-encoding a student
+    (repairs, encoder upgrades) runs only the descriptor network on the chip
+    instead of detection on the full photo. Lives in its own table so the
+    ~40 KB blob is never loaded with ordinary Student queries.
+    """
+
+    student = models.OneToOneField(
+        Student, on_delete=models.CASCADE, primary_key=True, related_name="face_chip"
+    )
+    chip = models.BinaryField()
+    landmarks = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def store(cls, student, chip, landmarks=None):
+        if not chip:
+            return None
+        obj, _ = cls.objects.update_or_create(
+            student=student, defaults={"chip": chip, "landmarks": landmarks}
+        )
+        return obj
+
+    def __str__(self):
+        return f"{self.student.roll_no} face chip"
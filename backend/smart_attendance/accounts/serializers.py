@@ -29,6 +29,7 @@ class StudentSerializer(serializers.ModelSerializer):
             "roll_no",
             "name",
             "face_encoding",
+            "has_face_encoding",
             "qr_code",
             "qr_code_url",
             "created_at",
@@ -43,6 +44,7 @@ class StudentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             "face_encoding",
+            "has_face_encoding",
             "qr_code",
             "created_at",
             "image_url",
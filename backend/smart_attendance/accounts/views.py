@@ -9,8 +9,12 @@ from rest_framework import filters, generics, pagination, status, viewsets
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from attendance.models import AdminToken
+from attendance.utils import face_worker
+from attendance.utils.face_utils import get_face_encoding, get_face_registration
 
-from .models import Batch, ClassGroup, Department, Student
+from .models import (
+    Batch, ClassGroup, Department, FaceChip, FaceReference, Student, current_encoder_version,
+)
 from .serializers import StudentSerializer
 
 logger = logging.getLogger(__name__)
@@ -206,8 +210,9 @@ def batch_classgroups(request, batch_id):
 
 class RegisterStudent(APIView):
     def post(self, request):
-        # handle file upload via DRF
-        image = request.FILES.get("image")
+        # handle file upload via DRF; extra photos ("images") become reference encodings
+        extra_images = request.FILES.getlist("images")
+        image = request.FILES.get("image") or (extra_images.pop(0) if extra_images else None)
 
         # Create student record first (Student.save() will generate QR if missing)
         student = Student.objects.create(
@@ -221,11 +226,15 @@ class RegisterStudent(APIView):
 
             # After the file is saved, compute face encoding from the saved file path
             try:
-                encoding = get_face_encoding(student.image.path)
+                encoding, chip, landmarks = face_worker.run(
+                    get_face_registration, student.image.path
+                )
                 if encoding:
                     student.face_encoding = encoding
+                    student.encoding_version = current_encoder_version()
                     # Update only face_encoding field
-                    student.save(update_fields=["face_encoding"])
+                    student.save(update_fields=["face_encoding", "encoding_version"])
+                    FaceChip.store(student, chip, landmarks)
                 else:
                     # No face found — keep default encoding (zeros) and log
                     print(
@@ -236,6 +245,18 @@ class RegisterStudent(APIView):
         else:
             print("No image uploaded for student")
 
+        for extra in extra_images:
+            try:
+                encoding = face_worker.run(get_face_encoding, extra.read())
+                if encoding:
+                    FaceReference.objects.create(
+                        student=student, encoding=FaceReference.pack(encoding)
+                    )
+                else:
+                    print(f"Warning: No face detected in {extra.name} for {student.roll_no}")
+            except Exception as e:
+                print(f"Error extracting reference encoding for {student.roll_no}: {e}")
+
         # At this point:
         # - student.image points to the stored file path (media/students/...)
         # - student.qr_code has been generated/saved by the model's save() during create
@@ -263,6 +284,7 @@ class StudentListView(generics.ListAPIView):
       - batch (batch id)
       - department (department id)
       - search (search string for name or roll)
+      - has_face_encoding (true/false: students with / without a usable encoding)
     """
 
     queryset = Student.objects.select_related(
@@ -283,6 +305,7 @@ class StudentListView(generics.ListAPIView):
         batch = req.GET.get("batch")
         dept = req.GET.get("department")
         search = req.GET.get("search")
+        has_encoding = req.GET.get("has_face_encoding")
 
         if date_from:
             qs = qs.filter(created_at__date__gte=date_from)
@@ -296,6 +319,8 @@ class StudentListView(generics.ListAPIView):
             qs = qs.filter(
                 models.Q(name__icontains=search) | models.Q(roll_no__icontains=search)
             )
+        if has_encoding in ("true", "false"):
+            qs = qs.filter(has_face_encoding=has_encoding == "true")
 
         return qs
 
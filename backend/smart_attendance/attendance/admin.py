@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Attendance
+from .models import Attendance, DailyClassSummary, Holiday, Kiosk, KioskSchedule, WeeklyOff
 
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ('student', 'date', 'time', 'status')
@@ -9,3 +9,35 @@ class AttendanceAdmin(admin.ModelAdmin):
 
 admin.site.register(Attendance, AttendanceAdmin)
 
+
+class DailyClassSummaryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'class_group', 'present', 'on_time', 'late', 'updated_at')
+    list_filter = ('date', 'class_group')
+    date_hierarchy = 'date'
+    # Maintained by attendance.utils.summary; fix drift with rebuild_class_summary
+    readonly_fields = ('date', 'class_group', 'present', 'on_time', 'late', 'updated_at')
+
+admin.site.register(DailyClassSummary, DailyClassSummaryAdmin)
+
+
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'name')
+    date_hierarchy = 'date'
+
+admin.site.register(Holiday, HolidayAdmin)
+admin.site.register(WeeklyOff)
+
+
+
+class KioskScheduleInline(admin.TabularInline):
+    model = KioskSchedule
+    extra = 1
+
+
+class KioskAdmin(admin.ModelAdmin):
+    list_display = ('code', 'location', 'class_group', 'department', 'batch', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('code', 'location')
+    inlines = [KioskScheduleInline]
+
+admin.site.register(Kiosk, KioskAdmin)
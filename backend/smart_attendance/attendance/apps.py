@@ -1,6 +1,33 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def _is_serving_process():
+    # Only processes that serve requests need warm models: the WSGI/ASGI entry
+    # points opt in through FACE_SERVING_PROCESS, runserver in the autoreloader
+    # child. Commands, shells, scripts and celery workers calling django.setup()
+    # never load dlib or start a face pool.
+    if getattr(settings, "FACE_SERVING_PROCESS", False):
+        return True
+    return sys.argv[1:2] == ["runserver"] and os.environ.get("RUN_MAIN") == "true"
 
 
 class AttendanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attendance'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (gallery invalidation, summary on Attendance delete)
+
+        if getattr(settings, "FACE_WARMUP_ON_BOOT", True) and _is_serving_process():
+            from .utils import face_worker
+
+            face_worker.start_warm_up()
+
+        if getattr(settings, "FACE_SHARD_PREWARM", True) and _is_serving_process():
+            from .utils import shards
+
+            shards.start_prewarm()
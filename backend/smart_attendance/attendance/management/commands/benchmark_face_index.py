@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from attendance.utils.ann_index import IVFIndex
+
+
+def synthetic_encodings(people, per_person, dim, rng):
+    # Face encodings of one person sit ~0.3-0.4 apart and different people ~0.8-1.0
+    # apart; reproduce that with a random centre per person plus small noise.
+    centres = rng.normal(0, 0.09, size=(people, dim)).astype(np.float32)
+    labels = np.repeat(np.arange(people), per_person)
+    noise = rng.normal(0, 0.025, size=(people * per_person, dim)).astype(np.float32)
+    return labels, centres[labels] + noise, centres
+
+
+class Command(BaseCommand):
+    help = "Compare recall and latency of the IVF face index against brute force on synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--people", type=int, default=20000)
+        parser.add_argument("--per-person", type=int, default=2)
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument("--nlist", type=int, default=None)
+        parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        rng = np.random.default_rng(opts["seed"])
+        dim = 128
+        labels, vectors, centres = synthetic_encodings(
+            opts["people"], opts["per_person"], dim, rng
+        )
+        targets = rng.integers(0, opts["people"], size=opts["queries"])
+        queries = centres[targets] + rng.normal(0, 0.025, size=(len(targets), dim)).astype(np.float32)
+        self.stdout.write(f"Gallery: {len(vectors)} vectors, {len(queries)} queries")
+
+        # Brute force ground truth
+        start = time.perf_counter()
+        truth = []
+        for q in queries:
+            truth.append(labels[int(np.argmin(np.linalg.norm(vectors - q, axis=1)))])
+        brute_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        self.stdout.write(f"brute force: {brute_ms:.3f} ms/query")
+
+        start = time.perf_counter()
+        trained = IVFIndex.train(vectors, nlist=opts["nlist"])
+        index = trained.rebuild(labels, vectors)
+        self.stdout.write(
+            f"IVF build: {len(index.centroids)} partitions in {time.perf_counter() - start:.1f}s"
+        )
+
+        for nprobe in opts["nprobe"]:
+            start = time.perf_counter()
+            hits = 0
+            for q, expected in zip(queries, truth):
+                found, _ = index.search(q, k=1, nprobe=nprobe)
+                hits += len(found) and found[0] == expected
+            ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            self.stdout.write(
+                f"nprobe={nprobe:<3} recall@1={hits / len(queries):.3f} "
+                f"{ivf_ms:.3f} ms/query ({brute_ms / ivf_ms:.1f}x)"
+            )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from attendance.utils import encoding_store
+
+
+class Command(BaseCommand):
+    help = "Rebuild the memory-mapped face encoding store from the database"
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        version = encoding_store.export_from_db()
+        store = encoding_store.open_store(version)
+        self.stdout.write(
+            f"Published {version}: {len(store)} encodings, "
+            f"{store.vectors.dtype} rows, "
+            f"{'IVF-partitioned' if store.centroids is not None else 'flat'}, "
+            f"{time.perf_counter() - start:.1f}s"
+        )
+
+# Usage: python manage.py export_face_store
+# Run from cron (e.g. nightly) so check-in reference top-ups join the gallery.
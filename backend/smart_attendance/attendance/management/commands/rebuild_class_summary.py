@@ -0,0 +1,32 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.utils import summary
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}. Use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyClassSummary rows from Attendance (all dates by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=_date, default=None)
+        parser.add_argument("--to", dest="date_to", type=_date, default=None)
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        written = summary.rebuild(opts["date_from"], opts["date_to"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} class/day summaries in {time.perf_counter() - start:.1f}s"
+        ))
+
+# Usage: python manage.py rebuild_class_summary [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+# Run once after deploying the summary table, and after bulk imports or manual
+# Attendance edits that bypass the API.
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_student_has_face_encoding'),
+        ('attendance', '0004_kiosk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyClassSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('on_time', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='accounts.classgroup')),
+            ],
+            options={
+                'ordering': ['-date', 'class_group'],
+                'unique_together': {('date', 'class_group')},
+            },
+        ),
+    ]
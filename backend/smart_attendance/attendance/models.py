@@ -1,7 +1,22 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
 from django.db import models
-from accounts.models import Student
+from accounts.models import Batch, ClassGroup, Department, Student
 from django.utils import timezone
 
+# date.weekday() values, shared by the timetable and the working-day calendar
+WEEKDAY_CHOICES = [
+    (0, 'Monday'),
+    (1, 'Tuesday'),
+    (2, 'Wednesday'),
+    (3, 'Thursday'),
+    (4, 'Friday'),
+    (5, 'Saturday'),
+    (6, 'Sunday'),
+]
+
+
 # Create your models here.
 class Attendance(models.Model):
     STATUS_CHOICES = [
@@ -26,6 +41,53 @@ class Attendance(models.Model):
         return f"{self.student.name} - {self.date} ({self.status})"
 
 
+class DailyClassSummary(models.Model):
+    """Per-day, per-class attendance counts, kept in step with Attendance.
+
+    Written by attendance.utils.summary in the same transaction as the
+    Attendance change (deletes through attendance.signals); `python manage.py
+    rebuild_class_summary` recomputes it, e.g. after moving students between
+    classes, since rows are counted under the student's class at write time.
+    Absent counts are not stored: they are the class size minus `present`.
+    """
+    date = models.DateField()
+    class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, related_name="daily_summaries")
+    present = models.PositiveIntegerField(default=0)
+    on_time = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date', 'class_group']
+        unique_together = (('date', 'class_group'),)
+
+    def __str__(self):
+        return f"{self.class_group} - {self.date} ({self.present} present)"
+
+
+class Holiday(models.Model):
+    """A day with no classes; not counted as a working day (absence reports)."""
+    date = models.DateField(unique=True)
+    name = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date} {self.name}".strip()
+
+
+class WeeklyOff(models.Model):
+    """A weekday that is never a working day (e.g. Saturday)."""
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, unique=True)
+
+    class Meta:
+        ordering = ['weekday']
+
+    def __str__(self):
+        return self.get_weekday_display()
+
+
 class AdminSetting(models.Model):
     """Singleton-ish model to store admin PIN hash."""
     pin_hash = models.CharField(max_length=255, blank=True, null=True)
@@ -45,3 +107,55 @@ class AdminToken(models.Model):
 
     def __str__(self):
         return f"AdminToken(key={self.key})"
+
+
+class Kiosk(models.Model):
+    """A check-in device installed at a fixed location.
+
+    Identification at a kiosk only searches the students it can expect: the
+    class scheduled in its room right now, else its default class group,
+    department or batch, else everyone.
+    """
+    code = models.SlugField(max_length=50, unique=True, help_text="Sent by the kiosk as kiosk=<code>")
+    location = models.CharField(max_length=100, help_text="e.g. Room 204")
+    class_group = models.ForeignKey(ClassGroup, null=True, blank=True, on_delete=models.SET_NULL)
+    department = models.ForeignKey(Department, null=True, blank=True, on_delete=models.SET_NULL)
+    batch = models.ForeignKey(Batch, null=True, blank=True, on_delete=models.SET_NULL)
+    is_active = models.BooleanField(default=True)
+
+    def current_scope(self, now=None):
+        """``(kind, pk)`` of the gallery shard to search, or None for all students."""
+        now = timezone.localtime(now or timezone.now())
+        early = timedelta(minutes=getattr(settings, "FACE_SHARD_EARLY_MINUTES", 15))
+        for entry in self.schedule.all():
+            if entry.weekday != now.weekday():
+                continue
+            start = datetime.combine(now.date(), entry.start_time, tzinfo=now.tzinfo) - early
+            end = datetime.combine(now.date(), entry.end_time, tzinfo=now.tzinfo)
+            if start <= now <= end:
+                return ("class_group", entry.class_group_id)
+        if self.class_group_id:
+            return ("class_group", self.class_group_id)
+        if self.department_id:
+            return ("department", self.department_id)
+        if self.batch_id:
+            return ("batch", self.batch_id)
+        return None
+
+    def __str__(self):
+        return f"{self.code} ({self.location})"
+
+
+class KioskSchedule(models.Model):
+    """Weekly timetable slot: ``class_group`` meets at the kiosk's location."""
+    kiosk = models.ForeignKey(Kiosk, on_delete=models.CASCADE, related_name="schedule")
+    weekday = models.IntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+
+    def __str__(self):
+        return f"{self.kiosk.code}: {self.class_group} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
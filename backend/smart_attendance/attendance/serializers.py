@@ -1,5 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Attendance
+from .utils import summary
 from datetime import time as datetime_time
 from django.utils import timezone
 
@@ -41,5 +43,13 @@ class AttendanceSerializer(serializers.ModelSerializer):
         else:
             instance.status = 'absent'
         
-        instance.save()
+        # Keep the class's DailyClassSummary in step with the status change
+        class_group_id = instance.student.class_group_id
+        with transaction.atomic():
+            summary.lock(instance.date, [class_group_id])
+            # The status as committed, not as loaded: a concurrent edit may have changed it
+            old_status = Attendance.objects.select_for_update().values_list("status", flat=True).get(pk=instance.pk)
+            instance.save()
+            if instance.status != old_status:
+                summary.apply(instance.date, class_group_id, old_status, instance.status)
         return instance
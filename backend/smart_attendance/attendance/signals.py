@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import FaceReference, Student
+
+from .models import Attendance
+from .utils import gallery, summary
+
+
+def _update_after_commit(student_id):
+    # Queue the student once the write is durable; changes close together
+    # (one registration, a bulk import) are published as one store version
+    transaction.on_commit(lambda: gallery.schedule_update(student_id))
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, update_fields=None, **kwargs):
+    # Only encoding writes change the gallery; FK/name edits do not.
+    if update_fields is None or "face_encoding" in update_fields:
+        _update_after_commit(instance.pk)
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    _update_after_commit(instance.pk)
+
+
+@receiver(post_save, sender=FaceReference)
+@receiver(post_delete, sender=FaceReference)
+def face_reference_changed(sender, instance, **kwargs):
+    # Check-in top-ups are picked up by the next full export (export_face_store)
+    # instead of publishing a store version per check-in during the morning rush.
+    if instance.source == "registration":
+        _update_after_commit(instance.student_id)
+
+
+@receiver(pre_delete, sender=Attendance)
+def attendance_deleting(sender, instance, **kwargs):
+    # Runs inside the delete's transaction (admin, API, Student cascade): lock
+    # the summary row before the Attendance row goes, like every other writer
+    instance._summary_class_id = (
+        Student.objects.filter(pk=instance.student_id).values_list("class_group_id", flat=True).first()
+    )
+    summary.lock(instance.date, [instance._summary_class_id])
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    summary.apply(instance.date, instance._summary_class_id, instance.status, None)
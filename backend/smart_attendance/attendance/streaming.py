@@ -0,0 +1,218 @@
+"""WebSocket check-in for kiosks that stream camera frames.
+
+    ws://<host>/ws/attendance/stream/[?roll_no=<roll_no>][&kiosk=<code>]
+
+The client sends JPEG frames as binary messages and gets JSON text messages
+back. With ``roll_no`` the frames are verified against that student (QR flow),
+without it they are identified against the gallery (only the kiosk's current
+class when ``kiosk`` names a registered Kiosk). The first frame
+whose face is within FACE_MATCH_TOLERANCE marks attendance, answers
+``{"type": "marked", ...}`` and closes the socket.
+
+Frames are never queued: while one frame is being encoded only the newest
+incoming frame is kept, so a slow server simply skips frames instead of
+falling behind the camera (``dropped`` in every reply tells the client how
+many it could stop sending). The face box found in one frame narrows HOG
+detection in the next (``face_utils.get_unknown_face(region=...)``).
+
+Other replies: ``status`` (frame rejected or no match yet, with ``reason``),
+``error`` (unknown roll number) and ``timeout`` once FACE_STREAM_MAX_SECONDS
+pass without a match.
+"""
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+
+from accounts.models import FaceReference, Student
+
+from .models import Attendance
+from .utils import face_worker
+from .utils.face_utils import get_unknown_face, reference_encodings
+from .utils.gallery import get_match_tolerance
+from .utils.marking import mark_present, store_attendance_image, student_payload
+from .utils.quality import FrameRejected, check_image_bytes
+from .utils.shards import gallery_for_kiosk
+
+logger = logging.getLogger(__name__)
+
+
+def _load_student(roll_no=None, pk=None):
+    students = Student.objects.select_related("class_group", "batch", "department")
+    lookup = {"roll_no": roll_no} if roll_no is not None else {"pk": pk}
+    return students.prefetch_related("face_references").filter(**lookup).first()
+
+
+def _existing_attendance(student):
+    return Attendance.objects.filter(student=student, date=timezone.localdate()).first()
+
+
+def _identify(encoding, kiosk=None):
+    return gallery_for_kiosk(kiosk).identify(encoding)
+
+
+def _record_checkin(student, data, encoding, distance):
+    attendance, created = mark_present(student)
+    if created:
+        store_attendance_image(data, student.roll_no, attendance.date)
+        FaceReference.add_checkin(student, encoding, distance)
+    message = f"Attendance marked for {student.name}" if created else "Attendance already marked today"
+    return {"message": message, **student_payload(student, attendance)}
+
+
+class CheckinStream:
+    """One kiosk connection: keeps the newest frame and matches it."""
+
+    def __init__(self, receive, send, student=None, kiosk=None):
+        self.receive = receive
+        self.send = send
+        self.student = student
+        self.kiosk = kiosk
+        self.references = None
+        self.frame = None
+        self.frame_ready = asyncio.Event()
+        self.closed = False
+        self.frames = 0
+        self.dropped = 0
+        self.region = None
+
+    async def send_json(self, payload):
+        if self.closed:
+            return
+        payload.update(frames=self.frames, dropped=self.dropped)
+        await self.send({"type": "websocket.send", "text": json.dumps(payload)})
+
+    async def close(self, code=1000):
+        if not self.closed:
+            self.closed = True
+            await self.send({"type": "websocket.close", "code": code})
+
+    async def read_frames(self):
+        while True:
+            message = await self.receive()
+            if message["type"] == "websocket.disconnect":
+                self.closed = True
+                self.frame_ready.set()
+                return
+            data = message.get("bytes")
+            if not data:
+                continue
+            if self.frame is not None:
+                # Still busy with an older frame: replace it, never queue
+                self.dropped += 1
+            self.frame = data
+            self.frame_ready.set()
+
+    async def match(self, encoding):
+        """``(student, distance)`` of a confident match, else ``(None, distance)``."""
+        if self.student is None:
+            student_id, distance = await sync_to_async(_identify)(encoding, self.kiosk)
+            if student_id is None:
+                return None, distance
+            return await sync_to_async(_load_student)(pk=student_id), distance
+
+        if self.references is None:
+            self.references = await sync_to_async(reference_encodings)(self.student)
+        if not len(self.references):
+            return None, None
+        distance = float(np.linalg.norm(self.references - encoding, axis=1).min())
+        if distance > get_match_tolerance():
+            return None, distance
+        return self.student, distance
+
+    async def process(self, data):
+        """Handle one frame; returns True once attendance is marked."""
+        self.frames += 1
+        try:
+            await sync_to_async(check_image_bytes, thread_sensitive=False)(data)
+            encoding, box = await face_worker.run_async(get_unknown_face, data, self.region)
+        except FrameRejected as e:
+            await self.send_json({"type": "status", "reason": e.reason, "message": e.message})
+            return False
+        except UnidentifiedImageError:
+            # A corrupt frame only costs that frame, not the session
+            await self.send_json({"type": "status", "reason": "invalid_image"})
+            return False
+        except face_worker.FaceWorkerBusy:
+            await self.send_json({"type": "status", "reason": "busy"})
+            return False
+        except face_worker.FaceWorkerTimeout:
+            await self.send_json({"type": "status", "reason": "timeout"})
+            return False
+
+        self.region = box
+        if encoding is None:
+            await self.send_json({"type": "status", "reason": "no_face"})
+            return False
+
+        student, distance = await self.match(encoding)
+        if student is None:
+            await self.send_json({"type": "status", "reason": "no_match", "distance": distance})
+            return False
+
+        payload = await sync_to_async(_record_checkin)(student, data, encoding, distance)
+        await self.send_json({"type": "marked", **payload, "distance": distance})
+        return True
+
+    async def run(self):
+        deadline = time.monotonic() + getattr(settings, "FACE_STREAM_MAX_SECONDS", 30)
+        reader = asyncio.ensure_future(self.read_frames())
+        try:
+            while not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    await self.send_json({"type": "timeout", "message": "No face matched, please try again"})
+                    break
+                try:
+                    await asyncio.wait_for(self.frame_ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    continue
+                self.frame_ready.clear()
+                data, self.frame = self.frame, None
+                if data is None:
+                    continue
+                if await self.process(data):
+                    break
+        except Exception as e:
+            logger.exception("Streaming check-in failed: %s", e)
+            await self.send_json({"type": "error", "error": f"Error processing image: {str(e)}"})
+        finally:
+            reader.cancel()
+            await self.close()
+
+
+async def stream_checkin(scope, receive, send):
+    """ASGI websocket handler for /ws/attendance/stream/."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+
+    params = parse_qs(scope.get("query_string", b"").decode())
+    roll_no = params.get("roll_no", [None])[0]
+    stream = CheckinStream(receive, send, kiosk=params.get("kiosk", [None])[0])
+    if roll_no:
+        student = await sync_to_async(_load_student)(roll_no=roll_no)
+        if student is None:
+            await stream.send_json({"type": "error", "error": "Student not found"})
+            await stream.close(4404)
+            return
+        attendance = await sync_to_async(_existing_attendance)(student)
+        if attendance is not None:
+            await stream.send_json({
+                "type": "marked",
+                "message": "Attendance already marked today",
+                **student_payload(student, attendance),
+            })
+            await stream.close()
+            return
+        stream.student = student
+
+    await stream.run()
@@ -0,0 +1,135 @@
+"""Pure NumPy approximate nearest-neighbour index for face encodings.
+
+An IVF (inverted file) index: k-means splits the encodings into ``nlist``
+partitions; a query is compared with the centroids, then exactly against the
+rows of the ``nprobe`` nearest partitions only (exact re-ranking of the
+shortlist). Rows carry a label (the student id); a student may own several
+rows (see FaceReference), and ``remove()`` drops all of them.
+
+Only the trained centroids are worth keeping: assigning N vectors to
+existing centroids is one matrix product, training is many. ``from_layout()``
+wraps rows already stored partition by partition (the memory-mapped encoding
+store) without copying them, including int8 rows with a per-row scale;
+``remove()``/``add()`` on such an index patch a few students into the layout
+without re-assigning everyone else.
+"""
+import numpy as np
+
+DIM = 128
+
+
+def _sq_distances(a, b):
+    """Squared euclidean distances between rows of ``a`` (n, d) and ``b`` (m, d)."""
+    d = (a * a).sum(axis=1)[:, None] - 2.0 * a @ b.T + (b * b).sum(axis=1)[None, :]
+    return np.maximum(d, 0.0)
+
+
+def kmeans(vectors, k, iterations=20, seed=0):
+    """Plain Lloyd's k-means; returns float32 centroids of shape (k, dim)."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmin(_sq_distances(vectors, centroids), axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty partitions from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), size=len(empty))]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index with exact re-ranking of the probed partitions."""
+
+    def __init__(self, centroids, nprobe=8):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        nlist = len(self.centroids)
+        self.list_labels = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.list_vectors = [np.empty((0, DIM), dtype=np.float32) for _ in range(nlist)]
+        # Per-row dequantization scales when list_vectors hold int8 rows
+        self.list_scales = None
+
+    @classmethod
+    def from_layout(cls, centroids, labels, vectors, sizes, scales=None, nprobe=8):
+        """Index over rows stored partition by partition; lists are views, not copies."""
+        index = cls(centroids, nprobe=nprobe)
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        spans = [slice(offsets[i], offsets[i + 1]) for i in range(len(index.centroids))]
+        index.list_labels = [labels[span] for span in spans]
+        index.list_vectors = [vectors[span] for span in spans]
+        if scales is not None:
+            index.list_scales = [scales[span] for span in spans]
+        return index
+
+    @classmethod
+    def train(cls, vectors, nlist=None, nprobe=8, iterations=20, seed=0):
+        """Build centroids from ``vectors``; nlist defaults to ~sqrt(N)."""
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(len(vectors))))
+        return cls(kmeans(vectors, nlist, iterations, seed), nprobe=nprobe)
+
+    def __len__(self):
+        return sum(len(labels) for labels in self.list_labels)
+
+    def assign(self, vectors):
+        """Partition number of each row of ``vectors``."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, DIM)
+        return np.argmin(_sq_distances(vectors, self.centroids), axis=1)
+
+    def add(self, labels, vectors):
+        """Insert rows; ``labels[i]`` is the student id owning ``vectors[i]``."""
+        labels = np.asarray(labels, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, DIM)
+        if not len(labels):
+            return
+        assign = self.assign(vectors)
+        for list_no in np.unique(assign):
+            mask = assign == list_no
+            self.list_labels[list_no] = np.concatenate(
+                [self.list_labels[list_no], labels[mask]]
+            )
+            self.list_vectors[list_no] = np.vstack(
+                [self.list_vectors[list_no], vectors[mask]]
+            )
+
+    def remove(self, labels):
+        """Drop every row owned by any of ``labels``."""
+        labels = np.asarray(labels, dtype=np.int64)
+        for list_no, list_labels in enumerate(self.list_labels):
+            keep = ~np.isin(list_labels, labels)
+            if not keep.all():
+                self.list_labels[list_no] = list_labels[keep]
+                self.list_vectors[list_no] = self.list_vectors[list_no][keep]
+
+    def search(self, query, k=1, nprobe=None):
+        """Return ``(labels, distances)`` of the k nearest rows (euclidean)."""
+        query = np.asarray(query, dtype=np.float32).reshape(1, DIM)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_d = _sq_distances(query, self.centroids)[0]
+        probe = np.argpartition(centroid_d, nprobe - 1)[:nprobe]
+
+        labels = np.concatenate([self.list_labels[i] for i in probe])
+        if not len(labels):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        vectors = np.vstack([self.list_vectors[i] for i in probe])
+        if self.list_scales is not None:
+            scales = np.concatenate([self.list_scales[i] for i in probe])
+            vectors = vectors.astype(np.float32) * scales[:, None]
+        distances = np.linalg.norm(vectors - query, axis=1)
+        k = min(k, len(labels))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return labels[top], distances[top]
+
+    def rebuild(self, labels, vectors):
+        """Return a new index with these rows on the current centroids."""
+        index = IVFIndex(self.centroids, nprobe=self.nprobe)
+        index.add(labels, vectors)
+        return index
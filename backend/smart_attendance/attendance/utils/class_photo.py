@@ -0,0 +1,95 @@
+"""Assigning the faces of a classroom photo to the students of one class.
+
+All faces of a photo are compared with every reference encoding of the class
+in a single (faces x references) distance matrix, reduced to each student's
+best-of-k distance. Faces are then assigned greedily from the closest pair
+up, so a student is given at most one face per photo and a face at most one
+student. A face whose two nearest students are both within tolerance and
+less than FACE_CLASS_PHOTO_AMBIGUITY_MARGIN apart is reported as ambiguous
+instead of being guessed.
+"""
+import numpy as np
+from django.conf import settings
+
+from .face_utils import reference_encodings
+from .gallery import get_match_tolerance
+
+MATCHED = "matched"
+UNMATCHED = "unmatched"
+AMBIGUOUS = "ambiguous"
+
+
+class ClassGallery:
+    """Reference encodings of a class: one row per reference, rows of a
+    student contiguous so per-student minima are a single reduceat."""
+
+    def __init__(self, students):
+        self.students, blocks = [], []
+        for student in students:
+            refs = reference_encodings(student)
+            if len(refs):
+                self.students.append(student)
+                blocks.append(refs)
+        if blocks:
+            self.vectors = np.vstack(blocks)
+            sizes = np.array([len(b) for b in blocks])
+            self.starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        else:
+            self.vectors = np.empty((0, 128), dtype=np.float64)
+            self.starts = np.empty(0, dtype=np.int64)
+        self._sq_norms = (self.vectors ** 2).sum(axis=1)
+
+    def __len__(self):
+        return len(self.students)
+
+    def distances(self, encodings):
+        """(faces, students) matrix of best-of-k Euclidean distances."""
+        sq = (
+            (encodings ** 2).sum(axis=1)[:, None]
+            + self._sq_norms[None, :]
+            - 2.0 * encodings @ self.vectors.T
+        )
+        per_reference = np.sqrt(np.maximum(sq, 0.0))
+        return np.minimum.reduceat(per_reference, self.starts, axis=1)
+
+
+def assign_faces(encodings, gallery, tolerance=None, margin=None):
+    """One ``(outcome, detail)`` per face of a photo.
+
+    ``MATCHED``: ``(student, distance)``; ``AMBIGUOUS``: list of
+    ``(student, distance)`` candidates; ``UNMATCHED``: nearest distance or None.
+    """
+    tolerance = get_match_tolerance() if tolerance is None else tolerance
+    if margin is None:
+        margin = getattr(settings, "FACE_CLASS_PHOTO_AMBIGUITY_MARGIN", 0.05)
+    if not len(encodings):
+        return []
+    if not len(gallery):
+        return [(UNMATCHED, None)] * len(encodings)
+
+    distances = gallery.distances(np.asarray(encodings, dtype=np.float64))
+    results = [None] * len(distances)
+
+    # Two near-equal candidates: don't guess between them
+    if distances.shape[1] > 1:
+        nearest = np.argsort(distances, axis=1)[:, :2]
+        best = np.take_along_axis(distances, nearest, axis=1)
+        ambiguous = (best[:, 1] <= tolerance) & (best[:, 1] - best[:, 0] < margin)
+        for face in np.flatnonzero(ambiguous):
+            results[face] = (AMBIGUOUS, [
+                (gallery.students[c], float(distances[face, c])) for c in nearest[face]
+            ])
+
+    taken = set()
+    faces, columns = np.nonzero(distances <= tolerance)
+    for k in np.argsort(distances[faces, columns], kind="stable"):
+        face, column = int(faces[k]), int(columns[k])
+        if results[face] is not None or column in taken:
+            continue
+        results[face] = (MATCHED, (gallery.students[column], float(distances[face, column])))
+        taken.add(column)
+
+    for face, result in enumerate(results):
+        if result is None:
+            results[face] = (UNMATCHED, float(distances[face].min()))
+    return results
@@ -0,0 +1,179 @@
+"""Micro-batching of check-in encodings across concurrent requests.
+
+At the morning peak many kiosks submit at once and every request used to be
+its own face-worker job. ``encode()`` instead parks the image with a
+per-process batcher thread, which waits up to FACE_BATCH_WINDOW_MS for more
+images (or until FACE_BATCH_MAX_SIZE are waiting) and splits them into about
+one ``face_utils.get_unknown_faces`` job per worker process, so HOG detection
+still runs in parallel while each job makes a single dlib descriptor call over
+its aligned face chips. Results are fanned back out to the waiting requests.
+
+FACE_BATCH_MAX_SIZE <= 1 disables batching (one ``get_unknown_face`` job per
+request, as before).
+"""
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+from . import face_worker
+from .face_utils import get_unknown_face, get_unknown_faces
+
+class EncodeBatcher:
+    def __init__(self, max_size=8, window=0.005):
+        self.max_size = max_size
+        self.window = window
+        self._pending = []  # (data, Future)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="face-encode-batcher", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.images = 0
+
+    def submit(self, data):
+        """Queue one image; the Future resolves to ``(encoding, face_box)``."""
+        future = Future()
+        with self._cond:
+            self._pending.append((data, future))
+            self._cond.notify()
+        return future
+
+    def _take_batch(self):
+        with self._cond:
+            while True:
+                while not self._pending:
+                    self._cond.wait()
+                # First image is in: give concurrent requests a few ms to join it
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                taken = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+                # Drop requests that already gave up (wait() timeout, QR-face cancel);
+                # the rest become RUNNING and can no longer be cancelled under us
+                batch = [(data, future) for data, future in taken if future.set_running_or_notify_cancel()]
+                if batch:
+                    return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            self.batches += 1
+            self.images += len(batch)
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                # Inline encode failure, a broken pool, ...: every request in the batch gets it
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _dispatch(self, batch):
+        processes = face_worker.get_pool_size()
+        if processes <= 0:
+            self._fan_out(batch, get_unknown_faces([data for data, _ in batch]))
+            return
+        # Detection is per image, so one job per process keeps every core busy
+        size = -(-len(batch) // processes)
+        for start in range(0, len(batch), size):
+            chunk = batch[start:start + size]
+            try:
+                self._submit_chunk(chunk)
+            except Exception as e:
+                # FaceWorkerBusy: only this chunk fails, the ones already sent run
+                for _, future in chunk:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _submit_chunk(self, batch):
+        job = face_worker.submit(get_unknown_faces, [data for data, _ in batch])
+
+        def done(job):
+            try:
+                results = job.result()
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            self._fan_out(batch, results)
+
+        # Don't wait here: the next batch can be collected while this one encodes
+        job.add_done_callback(done)
+
+    @staticmethod
+    def _fan_out(batch, results):
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_size": self.max_size,
+            "window_ms": self.window * 1000,
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch": round(self.images / self.batches, 2) if self.batches else None,
+        }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EncodeBatcher(
+                max_size=getattr(settings, "FACE_BATCH_MAX_SIZE", 8),
+                window=getattr(settings, "FACE_BATCH_WINDOW_MS", 5) / 1000,
+            )
+        return _batcher
+
+
+def stats():
+    """Batch-size counters of this process, or None before the first batch."""
+    return _batcher.stats() if _batcher is not None else None
+
+
+def submit(data):
+    """Start encoding ``data`` and return a Future of ``(encoding, face_box)``,
+    so callers can do other work (e.g. decode a QR code) meanwhile."""
+    if getattr(settings, "FACE_BATCH_MAX_SIZE", 8) > 1:
+        return get_batcher().submit(data)
+    if face_worker.get_pool_size() > 0:
+        return face_worker.submit(get_unknown_face, data)
+    future = Future()
+    try:
+        future.set_result(get_unknown_face(data))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def wait(future, timeout=None):
+    """Result of a ``submit()`` Future; FaceWorkerTimeout after ``timeout``
+    seconds (default settings.FACE_WORKER_TIMEOUT)."""
+    if timeout is None:
+        timeout = getattr(settings, "FACE_WORKER_TIMEOUT", 10)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise face_worker.FaceWorkerTimeout(f"Face job did not finish within {timeout}s")
+
+
+def encode(data, timeout=None):
+    """``(encoding, face_box)`` of the largest face in ``data``, batched with
+    concurrent requests. Raises like ``face_worker.run``."""
+    return wait(submit(data), timeout)
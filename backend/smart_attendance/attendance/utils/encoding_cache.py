@@ -0,0 +1,149 @@
+"""Per-process cache of face encodings keyed by the submitted image bytes.
+
+Kiosks and flaky clients often resubmit the very same frame; a hit skips the
+face worker (decode, HOG detection, landmarks, descriptor) entirely. Entries
+hold ``(encoding, face_box)`` -- including "no face" results -- with LRU
+eviction past FACE_CACHE_MAX_ENTRIES and a FACE_CACHE_TTL expiry.
+
+With FACE_CACHE_PHASH_DISTANCE > 0, frames whose 64-bit difference hash is
+within that many bits of a cached frame also count as hits (near-duplicates
+re-encoded by the client). Off by default: two different people framed the
+same way at a kiosk can hash close together.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from . import encode_batcher
+from .quality import check_image_bytes
+
+
+def difference_hash(data, size=8):
+    """64-bit dHash of an encoded image (JPEG draft-decoded at tiny size)."""
+    with Image.open(BytesIO(data)) as img:
+        img.draft("L", (size * 4, size * 4))
+        small = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class EncodingCache:
+    def __init__(self, max_entries=512, ttl=300, phash_distance=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()  # sha256 -> (expires_at, phash, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _expire(self, now):
+        for key in [k for k, (expires, _, _) in self._entries.items() if expires < now]:
+            del self._entries[key]
+
+    def get(self, key, phash=None):
+        """Return ``(found, result)`` for the content key (or a near-duplicate)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] >= now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[2]
+            if phash is not None and self.phash_distance:
+                self._expire(now)
+                for other, (_, other_phash, result) in self._entries.items():
+                    if other_phash is None:
+                        continue
+                    if bin(phash ^ other_phash).count("1") <= self.phash_distance:
+                        self._entries.move_to_end(other)
+                        self.near_hits += 1
+                        return True, result
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result, phash=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, phash, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EncodingCache(
+                max_entries=getattr(settings, "FACE_CACHE_MAX_ENTRIES", 512),
+                ttl=getattr(settings, "FACE_CACHE_TTL", 300),
+                phash_distance=getattr(settings, "FACE_CACHE_PHASH_DISTANCE", 0),
+            )
+        return _cache
+
+
+def submit_encode(data):
+    """Future of ``(encoding, face_box)`` for an uploaded image: already done
+    on a cache hit, otherwise queued on the face worker (batched with
+    concurrent requests, see ``encode_batcher``) and cached once it finishes.
+
+    Frames failing the quality gate raise quality.FrameRejected right away,
+    before reaching the worker.
+    """
+    cache = get_cache()
+    key = hashlib.sha256(data).hexdigest()
+    phash = None
+    if cache.phash_distance:
+        try:
+            phash = difference_hash(data)
+        except Exception:
+            phash = None
+    found, result = cache.get(key, phash)
+    if found:
+        future = Future()
+        future.set_result(result)
+        return future
+    check_image_bytes(data)
+    future = encode_batcher.submit(data)
+
+    def store(future):
+        # Worker errors propagate to the caller and are not cached
+        if not future.cancelled() and future.exception() is None:
+            cache.put(key, future.result(), phash)
+
+    future.add_done_callback(store)
+    return future
+
+
+def get_or_encode(data):
+    """``(encoding, face_box)`` for an uploaded image, from cache or the face worker.
+
+    Either value is None when no face was found. Raises like ``submit_encode``
+    and ``encode_batcher.wait``.
+    """
+    return encode_batcher.wait(submit_encode(data))
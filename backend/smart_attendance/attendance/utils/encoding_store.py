@@ -0,0 +1,384 @@
+"""Versioned, memory-mapped store of every enrolled face encoding.
+
+All usable encodings (``Student.face_encoding`` plus ``FaceReference`` rows,
+of the current encoder version unless FACE_MATCH_SAME_VERSION is off) are
+exported to compact ``.npy`` files that every worker maps read-only, so the
+pages live once in the OS page cache no matter how many gunicorn workers (and
+threads) identify against them::
+
+    FACE_DATA_DIR/store/
+        CURRENT           name of the live version directory
+        v<version>/
+            vectors.npy   (N, 128) float32, or int8 when FACE_STORE_DTYPE="int8"
+            scales.npy    (N,) float32 per-row scale, int8 stores only
+            labels.npy    (N,) int64 student id of each row
+            roll_nos.npy  (N,) roll number of each row
+            centroids.npy IVF centroids, stores with N >= FACE_ANN_MIN_SIZE only;
+            sizes.npy     rows are then written partition by partition
+
+A new version is written to a fresh directory and published by atomically
+replacing CURRENT, so readers always see a complete store and reload when the
+file changes. Writers serialise on an flock so concurrent patches never lose
+each other's rows. Superseded versions are deleted only once they have been
+out of CURRENT for FACE_STORE_RETAIN_SECONDS, so a reader that read CURRENT
+just before a publish can still map the version it was given.
+"""
+import contextlib
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .ann_index import IVFIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single process, no lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENCODING_DIM = 128
+ENCODING_BYTES = ENCODING_DIM * np.dtype(np.float64).itemsize
+REFERENCE_BYTES = ENCODING_DIM * np.dtype(np.float32).itemsize
+CHUNK_ROWS = 8192
+KEEP_VERSIONS = 2  # always kept, however old
+
+_current_cache = (None, None)  # (CURRENT mtime_ns, version)
+
+
+def decode_encoding(blob):
+    """Return a Student.face_encoding as a float64 vector, or None if unusable."""
+    if not blob or len(blob) != ENCODING_BYTES:
+        return None
+    vec = np.frombuffer(bytes(blob), dtype=np.float64)
+    if not vec.any():
+        # default_encoding() placeholder (all zeros)
+        return None
+    return vec
+
+
+def decode_reference(blob):
+    """Return a FaceReference encoding (float32 on disk) as float64, or None."""
+    if not blob or len(blob) != REFERENCE_BYTES:
+        return None
+    return np.frombuffer(bytes(blob), dtype=np.float32).astype(np.float64)
+
+
+def is_comparable(version):
+    """Whether a stored vector of encoder ``version`` may be matched against
+    encodings from the running pipeline (FACE_MATCH_SAME_VERSION)."""
+    from accounts.models import current_encoder_version
+
+    if not getattr(settings, "FACE_MATCH_SAME_VERSION", True):
+        return True
+    return version == current_encoder_version()
+
+
+def comparable_filter():
+    """``filter()`` kwargs selecting rows ``is_comparable`` accepts."""
+    from accounts.models import current_encoder_version
+
+    if not getattr(settings, "FACE_MATCH_SAME_VERSION", True):
+        return {}
+    return {"encoding_version": current_encoder_version()}
+
+
+def store_dir():
+    return os.path.join(settings.FACE_DATA_DIR, "store")
+
+
+def _empty_rows():
+    return (
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype="<U20"),
+        np.empty((0, ENCODING_DIM), dtype=np.float32),
+    )
+
+
+def load_rows_from_db(student_ids=None):
+    """Every usable encoding (of ``student_ids`` only, if given) as
+    ``(labels, roll_nos, vectors)``."""
+    from accounts.models import FaceReference, Student
+
+    students = Student.objects.filter(has_face_encoding=True, **comparable_filter())
+    references = FaceReference.objects.filter(**comparable_filter())
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+        references = references.filter(student_id__in=student_ids)
+
+    roll_by_id, labels, vectors = {}, [], []
+    rows = students.values_list("id", "roll_no", "face_encoding").iterator(chunk_size=2000)
+    for pk, roll_no, blob in rows:
+        roll_by_id[pk] = roll_no
+        vec = decode_encoding(blob)
+        if vec is not None:
+            labels.append(pk)
+            vectors.append(vec)
+
+    references = references.values_list("student_id", "student__roll_no", "encoding")
+    for pk, roll_no, blob in references.iterator(chunk_size=2000):
+        roll_by_id[pk] = roll_no
+        vec = decode_reference(blob)
+        if vec is not None:
+            labels.append(pk)
+            vectors.append(vec)
+
+    if not vectors:
+        return _empty_rows()
+    return (
+        np.asarray(labels, dtype=np.int64),
+        np.asarray([roll_by_id[pk] for pk in labels], dtype="<U20"),
+        np.vstack(vectors).astype(np.float32),
+    )
+
+
+def quantize(vectors):
+    """Symmetric per-row int8 quantization; returns ``(int8 rows, scales)``."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+class EncodingStore:
+    """Read-only, memory-mapped view of one store version."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.vectors = self._load("vectors.npy")
+        self.scales = self._load("scales.npy")
+        self.labels = self._load("labels.npy")
+        self.roll_nos = self._load("roll_nos.npy")
+        self.centroids = self._load("centroids.npy")
+        self.sizes = self._load("sizes.npy")
+
+    def _load(self, name):
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.labels)
+
+    def rows(self, start=0, end=None):
+        """Rows ``start:end`` as float32 (dequantized for int8 stores)."""
+        block = np.asarray(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block = block * self.scales[start:end, None]
+        return block
+
+    def take(self, indices):
+        """Rows at ``indices`` as float32 (dequantized for int8 stores)."""
+        block = np.asarray(self.vectors[indices], dtype=np.float32)
+        if self.scales is not None:
+            block = block * self.scales[indices, None]
+        return block
+
+    def distances(self, query):
+        """Euclidean distance from ``query`` to every row, in bounded chunks."""
+        query = np.asarray(query, dtype=np.float32)
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, len(self))
+            out[start:end] = np.linalg.norm(self.rows(start, end) - query, axis=1)
+        return out
+
+    def index(self, nprobe=8):
+        """IVF index over the mapped rows, or None for unpartitioned stores."""
+        if self.centroids is None:
+            return None
+        return IVFIndex.from_layout(
+            self.centroids, self.labels, self.vectors, self.sizes, self.scales, nprobe
+        )
+
+
+def _current_path():
+    return os.path.join(store_dir(), "CURRENT")
+
+
+def current_version(refresh=False):
+    """Version name in CURRENT (re-read only when the file changes), or None."""
+    global _current_cache
+    try:
+        mtime = os.stat(_current_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if refresh or _current_cache[0] != mtime:
+        with open(_current_path()) as f:
+            _current_cache = (mtime, f.read().strip())
+    return _current_cache[1]
+
+
+def open_store(version):
+    """Map ``version``; FileNotFoundError if it has been pruned."""
+    path = os.path.join(store_dir(), version)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Face encoding store {version} does not exist")
+    return EncodingStore(path, version)
+
+
+@contextlib.contextmanager
+def _write_lock():
+    os.makedirs(store_dir(), exist_ok=True)
+    with open(os.path.join(store_dir(), ".lock"), "w") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _partition(labels, roll_nos, vectors, previous):
+    """Order rows by IVF partition when the store is big enough to index.
+
+    Reuses the previous version's centroids unless the roster has outgrown
+    them (nlist ~ sqrt(N) at training time, so 4x nlist**2 rows).
+    """
+    if len(vectors) < getattr(settings, "FACE_ANN_MIN_SIZE", 5000):
+        return labels, roll_nos, vectors, None, None
+    centroids = previous.centroids if previous is not None else None
+    if centroids is None or len(vectors) > 4 * len(centroids) ** 2:
+        centroids = IVFIndex.train(vectors).centroids
+        logger.info("Trained face index with %d partitions", len(centroids))
+    trained = IVFIndex(centroids)
+    assign = trained.assign(vectors)
+    order = np.argsort(assign, kind="stable")
+    sizes = np.bincount(assign, minlength=len(centroids)).astype(np.int64)
+    return labels[order], roll_nos[order], vectors[order], np.asarray(centroids), sizes
+
+
+def _write(labels, roll_nos, vectors, previous=None, layout=None):
+    """Write a new version and publish it via CURRENT. Call under _write_lock.
+
+    ``layout=(centroids, sizes)`` means the rows are already in partition
+    order (see _patch_partitioned); otherwise they are partitioned here.
+    """
+    if layout is None:
+        labels, roll_nos, vectors, centroids, sizes = _partition(
+            labels, roll_nos, vectors, previous
+        )
+    else:
+        centroids, sizes = layout
+    version = f"v{time.time_ns()}"
+    final = os.path.join(store_dir(), version)
+    tmp = final + ".tmp"
+    os.makedirs(tmp)
+
+    if getattr(settings, "FACE_STORE_DTYPE", "float32") == "int8":
+        q, scales = quantize(vectors)
+        np.save(os.path.join(tmp, "vectors.npy"), q)
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+    else:
+        np.save(os.path.join(tmp, "vectors.npy"), vectors.astype(np.float32))
+    np.save(os.path.join(tmp, "labels.npy"), labels)
+    np.save(os.path.join(tmp, "roll_nos.npy"), roll_nos)
+    if centroids is not None:
+        np.save(os.path.join(tmp, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp, "sizes.npy"), sizes)
+    os.rename(tmp, final)
+
+    pointer_tmp = _current_path() + ".tmp"
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, _current_path())
+
+    _prune()
+
+    logger.info("Published face encoding store %s with %d rows", version, len(labels))
+    return version
+
+
+def _prune():
+    """Delete versions superseded more than FACE_STORE_RETAIN_SECONDS ago
+    (workers may still have them mapped or be about to open them)."""
+    versions = sorted(
+        (int(name[1:]), name) for name in os.listdir(store_dir())
+        if name.startswith("v") and name[1:].isdigit()
+    )
+    retain_ns = getattr(settings, "FACE_STORE_RETAIN_SECONDS", 300) * 1e9
+    now = time.time_ns()
+    # A version stops being CURRENT when the next one is published
+    for (_, name), (superseded_at, _) in zip(versions[:-KEEP_VERSIONS], versions[1:]):
+        if now - superseded_at > retain_ns:
+            shutil.rmtree(os.path.join(store_dir(), name), ignore_errors=True)
+
+
+def export_from_db():
+    """Rebuild the whole store from the database; returns the new version."""
+    with _write_lock():
+        version = current_version()
+        previous = open_store(version) if version else None
+        return _write(*load_rows_from_db(), previous=previous)
+
+
+def _patch_partitioned(previous, student_ids, labels, roll_nos, vectors):
+    """Swap the rows of ``student_ids`` inside the previous IVF layout: only the
+    new rows are assigned to the (unchanged) centroids, the others keep their
+    partition. Returns ``_write`` arguments."""
+    index = IVFIndex.from_layout(
+        previous.centroids, previous.labels, previous.vectors, previous.sizes, previous.scales
+    )
+    if index.list_scales is not None:
+        # add() appends float32 rows; int8 stores are re-quantized by _write
+        index.list_vectors = [
+            rows.astype(np.float32) * scales[:, None]
+            for rows, scales in zip(index.list_vectors, index.list_scales)
+        ]
+        index.list_scales = None
+    index.remove(student_ids)
+    index.add(labels, vectors)
+
+    # Roll numbers follow the labels: unchanged students from the previous
+    # store, patched ones from the database
+    prev_labels = np.asarray(previous.labels)
+    keep = ~np.isin(prev_labels, student_ids)
+    table_labels = np.concatenate([prev_labels[keep], labels])
+    table_rolls = np.concatenate([np.asarray(previous.roll_nos)[keep], roll_nos])
+    order = np.argsort(table_labels, kind="stable")
+    out_labels = np.concatenate(index.list_labels).astype(np.int64)
+    positions = np.searchsorted(table_labels[order], out_labels)
+    out_rolls = table_rolls[order][positions] if len(out_labels) else np.empty(0, dtype="<U20")
+    sizes = np.array([len(rows) for rows in index.list_labels], dtype=np.int64)
+    out_vectors = np.vstack([np.asarray(rows, dtype=np.float32) for rows in index.list_vectors])
+    return (out_labels, out_rolls, out_vectors), (np.asarray(previous.centroids), sizes)
+
+
+def patch_students(student_ids):
+    """Replace the rows of ``student_ids`` with what the database holds now and
+    publish the result as one new version; deleted students lose their rows.
+
+    Partitioned stores are patched through their IVF index (see
+    _patch_partitioned) unless the roster has outgrown the centroids.
+    """
+    student_ids = np.asarray(sorted(set(student_ids)), dtype=np.int64)
+    with _write_lock():
+        version = current_version(refresh=True)
+        if version is None:
+            return _write(*load_rows_from_db())
+        previous = open_store(version)
+        labels, roll_nos, vectors = load_rows_from_db(student_ids.tolist())
+        prev_labels = np.asarray(previous.labels)
+        keep = ~np.isin(prev_labels, student_ids)
+        total = int(keep.sum()) + len(labels)
+
+        if (
+            previous.centroids is not None
+            and getattr(settings, "FACE_ANN_MIN_SIZE", 5000) <= total <= 4 * len(previous.centroids) ** 2
+        ):
+            rows, layout = _patch_partitioned(previous, student_ids, labels, roll_nos, vectors)
+            return _write(*rows, previous=previous, layout=layout)
+
+        return _write(
+            np.concatenate([prev_labels[keep], labels]),
+            np.concatenate([np.asarray(previous.roll_nos)[keep], roll_nos]),
+            np.vstack([previous.rows()[keep], vectors]),
+            previous=previous,
+        )
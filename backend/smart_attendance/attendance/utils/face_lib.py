@@ -0,0 +1,45 @@
+"""Lazy facade over the face_recognition/dlib stack.
+
+Importing face_recognition loads dlib and its model files, which costs seconds
+and a few hundred MB of RSS. Modules that may be imported by processes that
+never touch faces (the URLconf, migrations, admin, cron jobs) go through this
+facade instead, so the stack is only loaded on first real use::
+
+    from attendance.utils import face_lib
+    face_lib.face_locations(image)   # imports face_recognition here
+"""
+import importlib
+import threading
+
+_lock = threading.Lock()
+_module = None
+_dlib = None
+
+
+def load():
+    """Import face_recognition (once per process) and return the module."""
+    global _module
+    if _module is None:
+        with _lock:
+            if _module is None:
+                _module = importlib.import_module("face_recognition")
+    return _module
+
+
+def load_dlib():
+    """The dlib module itself, for APIs face_recognition does not wrap
+    (aligned face chips, batched descriptors)."""
+    global _dlib
+    if _dlib is None:
+        load()
+        _dlib = importlib.import_module("dlib")
+    return _dlib
+
+
+def is_loaded():
+    return _module is not None
+
+
+def __getattr__(name):
+    # face_lib.face_encodings(...) etc. resolve against the real module lazily
+    return getattr(load(), name)
@@ -1,10 +1,88 @@
-import face_recognition
+from io import BytesIO
+
 import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from . import face_lib
+from .gallery import decode_encoding, decode_reference, get_match_tolerance, is_comparable
+from .quality import check_face_size
+
+# Side of the aligned face chips fed to (and stored for) the descriptor network
+CHIP_SIZE = 150
+
+def load_image(source, max_side=None):
+    # Decodes a path, raw bytes, file-like upload or ready RGB array into an RGB uint8 array.
+    # Images larger than max_side (default settings.FACE_DECODE_MAX_SIDE) are decoded at
+    # reduced resolution: for JPEGs draft() lets libjpeg DCT-scale by 1/2, 1/4 or 1/8
+    # while decoding, so the full-resolution bitmap is never materialised.
+    if isinstance(source, np.ndarray):
+        return source
+    if max_side is None:
+        max_side = getattr(settings, "FACE_DECODE_MAX_SIDE", None)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    with Image.open(source) as img:
+        if max_side and max(img.size) > max_side:
+            scale = max_side / max(img.size)
+            img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+            img = img.convert("RGB")
+            # draft() only gets within a power of two; finish with a real resize
+            img.thumbnail((max_side, max_side), Image.BILINEAR)
+        return np.array(img.convert("RGB"))
+
+def locate_faces(image, max_side=None):
+    # Runs HOG detection on a copy no larger than max_side (default
+    # settings.FACE_DETECTION_MAX_SIDE) and maps the boxes back to `image` coordinates.
+    # Largest face first, so the person standing at the kiosk wins over the background.
+    if max_side is None:
+        max_side = getattr(settings, "FACE_DETECTION_MAX_SIDE", None)
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / max(height, width)) if max_side else 1.0
+    if scale < 1.0:
+        small = Image.fromarray(image).resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR
+        )
+        small = np.array(small)
+    else:
+        small = image
+
+    locations = []
+    for top, right, bottom, left in face_lib.face_locations(small):
+        locations.append((
+            max(0, int(round(top / scale))),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(round(left / scale))),
+        ))
+    locations.sort(key=lambda box: (box[2] - box[0]) * (box[1] - box[3]), reverse=True)
+    return locations
+
+def locate_faces_near(image, region, margin=0.6):
+    # Tracks a face between stream frames: detects only inside the previous face box
+    # grown by `margin` of its size on each side, then maps boxes back to `image`.
+    height, width = image.shape[:2]
+    top, right, bottom, left = region
+    pad_y, pad_x = int((bottom - top) * margin), int((right - left) * margin)
+    y0, y1 = max(0, top - pad_y), min(height, bottom + pad_y)
+    x0, x1 = max(0, left - pad_x), min(width, right + pad_x)
+    if y1 - y0 < 2 or x1 - x0 < 2:
+        return []
+    crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+    return [(t + y0, r + x0, b + y0, l + x0) for t, r, b, l in locate_faces(crop)]
+
+def encode_faces(image, locations=None):
+    # Landmarks and the 128-d descriptor are computed on the working-resolution frame
+    if locations is None:
+        locations = locate_faces(image)
+    if not locations:
+        return []
+    return face_lib.face_encodings(image, known_face_locations=locations)
 
 def get_face_encoding(image_path):
     # Extracts a 128-dim float64 encoding from the image for storage
-    image = face_recognition.load_image_file(image_path)
-    encodings = face_recognition.face_encodings(image)
+    image = load_image(image_path)
+    encodings = encode_faces(image)
     if not encodings:
         print("No face found in registration image.")
         return None
@@ -15,30 +93,181 @@ def get_face_encoding(image_path):
         return None
     return encoding.tobytes()
 
-def match_face(unknown_image_path, known_students):
-    # Loads the student's stored encoding and compares it to the new image's encoding
-    unknown_image = face_recognition.load_image_file(unknown_image_path)
-    unknown_encs = face_recognition.face_encodings(unknown_image)
+def get_unknown_face(unknown_image, region=None):
+    # Encodes the largest face in an attendance image: (encoding, face_box) or (None, None).
+    # Accepts anything load_image() does, so uploads never need a temp file.
+    # With `region` (the face box from the previous stream frame) detection runs on
+    # that neighbourhood first and falls back to the full frame if the face moved away.
+    unknown_image = load_image(unknown_image)
+    locations = locate_faces_near(unknown_image, region)[:1] if region else []
+    if not locations:
+        locations = locate_faces(unknown_image)[:1]
+    if locations:
+        # Reject tiny faces before paying for landmarks and the descriptor
+        check_face_size(locations[0])
+    unknown_encs = encode_faces(unknown_image, locations)
     if not unknown_encs:
-        print("No face detected in attendance image.")
-        return "no_face"
-    unknown_enc = np.asarray(unknown_encs[0], dtype=np.float64)
-    print(f"Unknown encoding (shape={unknown_enc.shape}, dtype={unknown_enc.dtype}): {unknown_enc}")
+        return None, None
+    return np.asarray(unknown_encs[0], dtype=np.float64), locations[0]
 
-    for student in known_students:
-        if not student.face_encoding:
-            print(f"Student {student.roll_no} has no face_encoding stored.")
+def align_face(image, location, size=CHIP_SIZE):
+    # (aligned chip, 5-point landmark shape): the chip is the exact crop dlib's
+    # descriptor network sees, so encoding it later reproduces the encoding
+    api = face_lib.api
+    shape = api.pose_predictor_5_point(image, api._css_to_rect(location))
+    return face_lib.load_dlib().get_face_chip(image, shape, size=size), shape
+
+def face_chip(image, location, size=CHIP_SIZE):
+    return align_face(image, location, size)[0]
+
+def get_face_registration(source):
+    # Registration photo -> (encoding bytes, chip PNG bytes, landmarks) or (None, None, None).
+    # Detection runs once here; the stored chip lets encode_chips() re-encode the student
+    # later (encoder upgrades, repairs) without touching the full photo again.
+    image = load_image(source)
+    locations = locate_faces(image)[:1]
+    if not locations:
+        print("No face found in registration image.")
+        return None, None, None
+    chip, shape = align_face(image, locations[0])
+    encoding = np.asarray(face_lib.api.face_encoder.compute_face_descriptor(chip), dtype=np.float64)
+    buffer = BytesIO()
+    Image.fromarray(np.asarray(chip, dtype=np.uint8)).save(buffer, format="PNG")
+    landmarks = {
+        "image_size": [int(image.shape[1]), int(image.shape[0])],
+        "box": [int(v) for v in locations[0]],
+        "points": [[int(p.x), int(p.y)] for p in shape.parts()],
+    }
+    return encoding.tobytes(), buffer.getvalue(), landmarks
+
+def encode_chips(chips):
+    # Stored PNG chips -> float64 encoding bytes (None for unreadable chips), with a
+    # single batched descriptor call and no face detection at all.
+    arrays, owners = [], []
+    for i, data in enumerate(chips):
+        try:
+            with Image.open(BytesIO(bytes(data))) as img:
+                arrays.append(np.array(img.convert("RGB")))
+            owners.append(i)
+        except Exception as e:
+            print(f"Unreadable face chip: {e}")
+    results = [None] * len(chips)
+    if arrays:
+        descriptors = face_lib.api.face_encoder.compute_face_descriptor(arrays)
+        for i, descriptor in zip(owners, descriptors):
+            results[i] = np.asarray(descriptor, dtype=np.float64).tobytes()
+    return results
+
+def get_unknown_faces(sources):
+    # Batched get_unknown_face(): detection runs per image, then the aligned chips of all
+    # images go through the descriptor network in a single call. Returns one item per
+    # source, either (encoding, face_box) / (None, None) or the exception that image raised
+    # (e.g. FrameRejected), so one bad frame never fails the rest of the batch.
+    results = [(None, None)] * len(sources)
+    chips, owners = [], []
+    for i, source in enumerate(sources):
+        try:
+            image = load_image(source)
+            locations = locate_faces(image)[:1]
+            if not locations:
+                continue
+            check_face_size(locations[0])
+            chips.append(face_chip(image, locations[0]))
+            owners.append((i, locations[0]))
+        except Exception as e:
+            results[i] = e
+    if chips:
+        descriptors = face_lib.api.face_encoder.compute_face_descriptor(chips)
+        for (i, box), descriptor in zip(owners, descriptors):
+            results[i] = (np.asarray(descriptor, dtype=np.float64), box)
+    return results
+
+def get_all_faces(source, decode_max_side=None, detection_max_side=None):
+    # Every face in a group (classroom) photo: ((n, 128) float64 encodings, boxes).
+    # Group photos are decoded and searched at a higher resolution than kiosk frames
+    # (settings.FACE_CLASS_PHOTO_*) so back-row faces stay large enough for HOG.
+    # Faces smaller than FACE_CLASS_PHOTO_MIN_FACE_SIZE px are dropped, not failing the photo.
+    if decode_max_side is None:
+        decode_max_side = getattr(settings, "FACE_CLASS_PHOTO_DECODE_MAX_SIDE", 3200)
+    if detection_max_side is None:
+        detection_max_side = getattr(settings, "FACE_CLASS_PHOTO_DETECTION_MAX_SIDE", 1600)
+    min_size = getattr(settings, "FACE_CLASS_PHOTO_MIN_FACE_SIZE", 40)
+    image = load_image(source, max_side=decode_max_side)
+    boxes, chips = [], []
+    for location in locate_faces(image, max_side=detection_max_side):
+        top, right, bottom, left = location
+        if min(bottom - top, right - left) < min_size:
+            continue
+        boxes.append(location)
+        chips.append(face_chip(image, location))
+    if not chips:
+        return np.empty((0, 128), dtype=np.float64), []
+    descriptors = face_lib.api.face_encoder.compute_face_descriptor(chips)
+    return np.asarray(descriptors, dtype=np.float64).reshape(-1, 128), boxes
+
+def get_unknown_encoding(unknown_image):
+    # Encodes the first face found in an attendance image, or None if there is no face
+    return get_unknown_face(unknown_image)[0]
+
+def reference_encodings(student):
+    # Student.face_encoding plus every FaceReference as one (k, 128) float64 matrix.
+    # Uses prefetch_related("face_references") when the caller did it.
+    # Vectors from another encoder version are left out (see encoding_store.is_comparable).
+    rows = []
+    primary = decode_encoding(student.face_encoding) if is_comparable(student.encoding_version) else None
+    if primary is not None:
+        rows.append(primary)
+    for ref in student.face_references.all():
+        if not is_comparable(ref.encoding_version):
             continue
-        known_enc = np.frombuffer(student.face_encoding, dtype=np.float64)
-        print(f"Known encoding for {student.roll_no} (shape={known_enc.shape}, dtype={known_enc.dtype}): {known_enc}")
-        if known_enc.shape[0] != 128:
-            print(f"Skipping student {student.roll_no}: encoding shape {known_enc.shape}")
+        vec = decode_reference(ref.encoding)
+        if vec is not None:
+            rows.append(vec)
+    if not rows:
+        return np.empty((0, 128), dtype=np.float64)
+    return np.vstack(rows)
+
+def nearest_student(unknown_enc, known_students):
+    # Best-of-k distance over every reference of every candidate in one vectorized step.
+    # Returns (student, distance) for the closest reference, or (None, None).
+    candidates, owners, known_encs = [], [], []
+    for student in known_students:
+        refs = reference_encodings(student)
+        if not len(refs):
+            print(f"Skipping student {student.roll_no}: no usable face_encoding stored.")
             continue
-        # This is the actual linkage: compare the stored encoding (from registration) to the new encoding (from attendance)
-        match = face_recognition.compare_faces([known_enc], unknown_enc)
-        print(f"Compare result for {student.roll_no}: {match}")
-        if match[0]:
-            print(f"Face matched for {student.roll_no}")
-            return student
+        owners.extend([len(candidates)] * len(refs))
+        candidates.append(student)
+        known_encs.append(refs)
+    if not candidates:
+        return None, None
+
+    # This is the actual linkage: distances from the stored encodings (from registration)
+    # to the new encoding (from attendance), same metric as face_recognition.compare_faces
+    distances = np.linalg.norm(np.vstack(known_encs) - unknown_enc, axis=1)
+    best = int(np.argmin(distances))
+    return candidates[owners[best]], float(distances[best])
+
+def match_encoding(unknown_enc, known_students, tolerance=None):
+    # Compares an already computed encoding to every stored reference in one vectorized step.
+    # Pure NumPy, so it runs in the web process once the face worker has encoded the image.
+    student, distance = nearest_student(unknown_enc, known_students)
+    if student is None:
+        print("No matching face found.")
+        return None
+    tolerance = get_match_tolerance() if tolerance is None else tolerance
+    print(f"Best distance {distance:.4f} for {student.roll_no}")
+    if distance <= tolerance:
+        print(f"Face matched for {student.roll_no}")
+        return student
     print("No matching face found.")
-    return None
\ No newline at end of file
+    return None
+
+def warm_up():
+    # Pushes a synthetic frame through detection, landmarks and the descriptor network
+    # so the first real check-in does not pay for model loading.
+    image = np.tile(np.linspace(0, 255, 160, dtype=np.uint8), (160, 1))
+    image = np.ascontiguousarray(np.stack([image] * 3, axis=-1))
+    locate_faces(image)
+    face_lib.face_encodings(image, known_face_locations=[(20, 140, 140, 20)])
+    return True
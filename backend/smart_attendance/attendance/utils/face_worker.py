@@ -0,0 +1,238 @@
+"""Process pool that keeps dlib work off the web request threads.
+
+Views submit face jobs (module-level functions from ``face_utils`` taking raw
+bytes or a file path) and wait for the result with a timeout. The pool is
+persistent: each process imports face_recognition, loads the dlib models and
+runs a warm-up frame once in its initializer, so jobs never pay for it.
+
+Submission is bounded: at most ``FACE_WORKER_PROCESSES + FACE_WORKER_QUEUE_SIZE``
+jobs may be in flight per web worker. Past that ``FaceWorkerBusy`` is raised
+straight away instead of letting requests pile up behind a slow image.
+
+``FACE_WORKER_PROCESSES = 0`` runs jobs inline (handy for runserver/tests).
+"""
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_barrier = None
+
+# Set in each pool process by _init_worker
+_siblings = None
+
+# Spawning a process and loading the dlib models can take a while on a cold box
+WARM_UP_TIMEOUT = 120
+
+_ready = threading.Event()
+_warm_up_thread = None
+_warm_up_error = None
+
+
+class FaceWorkerBusy(Exception):
+    """Raised when the submission queue is full."""
+
+
+class FaceWorkerTimeout(Exception):
+    """Raised when a job does not finish within its timeout."""
+
+
+def get_pool_size():
+    return getattr(settings, "FACE_WORKER_PROCESSES", 0)
+
+
+def _init_worker(barrier):
+    # Runs once in every pool process: pay the dlib import/model load up front
+    global _siblings
+    from . import face_lib
+    from .face_utils import warm_up
+
+    face_lib.load()
+    warm_up()
+    _siblings = barrier
+
+    logger.info("Face worker process ready")
+
+
+def _await_siblings(timeout):
+    # Can only pass once every pool process holds one of these jobs, i.e. all
+    # of them have been spawned and finished _init_worker
+    _siblings.wait(timeout)
+    return True
+
+
+def _get_executor():
+    global _executor, _slots, _barrier
+    with _lock:
+        if _executor is None:
+            processes = get_pool_size()
+            queue_size = getattr(settings, "FACE_WORKER_QUEUE_SIZE", 16)
+            # spawn, not fork: gunicorn workers are threaded and hold DB sockets
+            context = multiprocessing.get_context("spawn")
+            # Handed over at spawn time: locks can't travel through the job queue
+            _barrier = context.Barrier(processes)
+            _executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(_barrier,),
+            )
+            _slots = threading.BoundedSemaphore(processes + queue_size)
+            logger.info("Started face worker pool with %d processes", processes)
+        return _executor, _slots
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def submit(fn, *args):
+    """Queue ``fn(*args)`` on the pool and return its Future.
+
+    Raises FaceWorkerBusy if the bounded queue is full.
+    """
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise FaceWorkerBusy("Face worker queue is full")
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _reset_executor()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def run(fn, *args, timeout=None):
+    """Run ``fn(*args)`` in the pool and block for at most ``timeout`` seconds.
+
+    Defaults to settings.FACE_WORKER_TIMEOUT. With no pool configured the job
+    runs inline in the calling thread.
+    """
+    if get_pool_size() <= 0:
+        return fn(*args)
+
+    if timeout is None:
+        timeout = getattr(settings, "FACE_WORKER_TIMEOUT", 10)
+    future = submit(fn, *args)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise FaceWorkerTimeout(f"Face job did not finish within {timeout}s")
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); start a fresh pool for the next request
+        logger.exception("Face worker pool broke; restarting it")
+        _reset_executor()
+        raise
+
+
+def run_many(fn, items, timeout=None):
+    """``[fn(item) for item in items]`` with every job queued on the pool at
+    once; ``timeout`` bounds the whole call. Raises like ``run()``."""
+    if get_pool_size() <= 0:
+        return [fn(item) for item in items]
+
+    if timeout is None:
+        timeout = getattr(settings, "FACE_WORKER_TIMEOUT", 10)
+    futures = []
+    try:
+        for item in items:
+            futures.append(submit(fn, item))
+        deadline = time.monotonic() + timeout
+        return [f.result(timeout=max(0.0, deadline - time.monotonic())) for f in futures]
+    except FutureTimeoutError:
+        raise FaceWorkerTimeout(f"Face jobs did not finish within {timeout}s")
+    except BrokenProcessPool:
+        logger.exception("Face worker pool broke; restarting it")
+        _reset_executor()
+        raise
+    finally:
+        for f in futures:
+            f.cancel()
+
+
+async def run_async(fn, *args, timeout=None):
+    """``run()`` for asyncio callers (the ASGI streaming endpoint): awaits the
+    pool future without blocking the event loop."""
+    if get_pool_size() <= 0:
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    if timeout is None:
+        timeout = getattr(settings, "FACE_WORKER_TIMEOUT", 10)
+    future = submit(fn, *args)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        raise FaceWorkerTimeout(f"Face job did not finish within {timeout}s")
+    except BrokenProcessPool:
+        logger.exception("Face worker pool broke; restarting it")
+        _reset_executor()
+        raise
+
+
+def _warm_up():
+    global _warm_up_error
+    from .face_utils import warm_up
+
+    try:
+        processes = get_pool_size()
+        if processes <= 0:
+            warm_up()
+        else:
+            # Each process warms up in its initializer; one barrier job per
+            # process (through the bounded queue) returns only once all have
+            _get_executor()
+            _barrier.reset()  # after a timed-out attempt
+            run_many(_await_siblings, [WARM_UP_TIMEOUT] * processes, timeout=WARM_UP_TIMEOUT + 5)
+        _warm_up_error = None
+        _ready.set()
+        logger.info("Face models warmed up")
+    except Exception as e:
+        _warm_up_error = str(e)
+        logger.exception("Face model warm-up failed: %s", e)
+
+
+def start_warm_up():
+    """Warm the models in a background thread; safe to call repeatedly."""
+    global _warm_up_thread
+    with _lock:
+        if _ready.is_set() or (_warm_up_thread and _warm_up_thread.is_alive()):
+            return
+        _warm_up_thread = threading.Thread(
+            target=_warm_up, name="face-warm-up", daemon=True
+        )
+        _warm_up_thread.start()
+
+
+def readiness():
+    """Return ``(ready, details)`` for the readiness endpoint."""
+    warming = bool(_warm_up_thread and _warm_up_thread.is_alive())
+    return _ready.is_set(), {
+        "warming": warming,
+        "processes": get_pool_size(),
+        "error": _warm_up_error,
+    }
+
+
+@atexit.register
+def _shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,152 @@
+"""Gallery of enrolled face encodings used for 1:N identification.
+
+Every valid ``Student.face_encoding`` and every ``FaceReference`` is one row of
+the memory-mapped encoding store (``encoding_store``), tagged with its student
+id, so an unknown encoding is compared against the whole roster with a single
+vectorized distance computation; the nearest row is the student's best-of-k
+match.
+
+Each process maps the current store version read-only and remaps it when the
+store's CURRENT pointer changes. The Student/FaceReference signals call
+``schedule_update()``: students changed within FACE_STORE_PUBLISH_DELAY
+seconds are patched into one new store version (a registration saves the
+student several times; a bulk import saves thousands), which every worker
+picks up on its next identification.
+
+Stores with at least ``FACE_ANN_MIN_SIZE`` rows are written partition by
+partition with IVF centroids, and identification goes through an
+``ann_index.IVFIndex`` over the mapped rows instead of a full scan.
+"""
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from . import encoding_store
+from .encoding_store import (  # noqa: F401  (re-exported for face_utils)
+    ENCODING_DIM,
+    decode_encoding,
+    decode_reference,
+    is_comparable,
+)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_gallery = None
+
+_dirty_lock = threading.Lock()
+_dirty = set()  # student ids waiting for the next publish
+_flush_timer = None
+
+
+def get_match_tolerance():
+    return getattr(settings, "FACE_MATCH_TOLERANCE", 0.6)
+
+
+class EncodingGallery:
+    """Student-id-labelled encodings of one store version, plus its IVF index."""
+
+    def __init__(self, store):
+        self.store = store
+        self.version = store.version
+        self.student_ids = store.labels
+        self.index = store.index(getattr(settings, "FACE_ANN_NPROBE", 8))
+        logger.info("Mapped face gallery %s with %d encodings", self.version, len(self))
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def distances(self, encoding):
+        """Euclidean distance from ``encoding`` to every row of the gallery."""
+        return self.store.distances(encoding)
+
+    def identify(self, encoding, tolerance=None):
+        """Return ``(student_id, distance)`` of the closest enrolled student.
+
+        Students own several rows, so this is their best-of-k distance.
+        ``student_id`` is None when the gallery is empty or the best distance is
+        above ``tolerance`` (defaults to settings.FACE_MATCH_TOLERANCE).
+        """
+        if not len(self):
+            return None, None
+        tolerance = get_match_tolerance() if tolerance is None else tolerance
+        if self.index is not None:
+            labels, distances = self.index.search(encoding, k=1)
+            if not len(labels):
+                return None, None
+            best_id, best_distance = int(labels[0]), float(distances[0])
+        else:
+            distances = self.distances(encoding)
+            best = int(np.argmin(distances))
+            best_id, best_distance = int(self.student_ids[best]), float(distances[best])
+        if best_distance > tolerance:
+            return None, best_distance
+        return best_id, best_distance
+
+
+def invalidate():
+    """Re-export the whole store from the database (after bulk writes that
+    bypass the signals, e.g. ``bulk_update``)."""
+    return encoding_store.export_from_db()
+
+
+def update_student(student_id):
+    """Publish a store version holding this student's current encodings
+    (none once deleted) right away; every process remaps it on next use."""
+    return encoding_store.patch_students([student_id])
+
+
+def schedule_update(student_id):
+    """Queue ``student_id`` for the next coalesced publish (immediately when
+    FACE_STORE_PUBLISH_DELAY is 0)."""
+    global _flush_timer
+    delay = getattr(settings, "FACE_STORE_PUBLISH_DELAY", 1.0)
+    with _dirty_lock:
+        _dirty.add(student_id)
+        if delay > 0 and _flush_timer is None:
+            # Not a daemon: a short-lived command still publishes before it exits
+            _flush_timer = threading.Timer(delay, flush_updates)
+            _flush_timer.name = "face-store-publish"
+            _flush_timer.start()
+    if delay <= 0:
+        flush_updates()
+
+
+def flush_updates():
+    """Publish every queued student in one store version."""
+    from django.db import close_old_connections
+
+    global _flush_timer
+    with _dirty_lock:
+        student_ids = sorted(_dirty)
+        _dirty.clear()
+        _flush_timer = None
+    if not student_ids:
+        return None
+    try:
+        return encoding_store.patch_students(student_ids)
+    except Exception:
+        logger.exception("Publishing face encodings of %d students failed", len(student_ids))
+        return None
+    finally:
+        if threading.current_thread().name == "face-store-publish":
+            close_old_connections()
+
+
+def get_gallery():
+    """Return the process-wide gallery, remapping it if the store changed."""
+    global _gallery
+    with _lock:
+        version = encoding_store.current_version()
+        if version is None:
+            version = encoding_store.export_from_db()
+        if _gallery is None or _gallery.version != version:
+            try:
+                store = encoding_store.open_store(version)
+            except FileNotFoundError:
+                # Pruned since CURRENT was cached: re-read it
+                store = encoding_store.open_store(encoding_store.current_version(refresh=True))
+            _gallery = EncodingGallery(store)
+        return _gallery
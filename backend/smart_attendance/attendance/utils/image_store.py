@@ -1,5 +1,7 @@
 import os
 import shutil
+import tempfile
+import time
 from django.utils import timezone
 from django.conf import settings
 
@@ -15,6 +17,10 @@ WEEKDAY_FOLDERS = {
 
 RETENTION_DAYS = 7
 
+# os.umask can only be read by setting it, so do that once at import time
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 def _ensure_dir(path):
     os.makedirs(path, exist_ok=True)
     return path
@@ -98,4 +104,41 @@ def save_attendance_image_from_path(src_path, roll_no, move_src=False):
                     except Exception:
                         pass
 
-    return main_dst
\ No newline at end of file
+    return main_dst
+
+
+def save_attendance_image_bytes(data, roll_no, dt=None):
+    """
+    Write an in-memory check-in snapshot straight to
+    MEDIA_ROOT/temp/<weekday_folder>/<roll_no>.jpg in a single disk write.
+    - Written to a unique temp name and renamed into place, so two concurrent
+      submissions for the same roll never interleave bytes.
+    - Gets FILE_UPLOAD_PERMISSIONS (or the umask default) like a normal upload,
+      not mkstemp's 0600.
+    - Files in that weekday folder older than RETENTION_DAYS are pruned.
+    """
+    dst_dir = _ensure_dir(get_weekday_folder_for_date(dt))
+    main_dst = os.path.join(dst_dir, f"{roll_no}.jpg")
+
+    fd, tmp_path = tempfile.mkstemp(dir=dst_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        mode = settings.FILE_UPLOAD_PERMISSIONS
+        os.chmod(tmp_path, mode if mode is not None else 0o666 & ~_UMASK)
+        os.replace(tmp_path, main_dst)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    cutoff = time.time() - RETENTION_DAYS * 24 * 3600
+    for fn in os.listdir(dst_dir):
+        fp = os.path.join(dst_dir, fn)
+        try:
+            if os.path.isfile(fp) and os.path.getmtime(fp) < cutoff:
+                os.remove(fp)
+        except Exception:
+            pass
+
+    return main_dst
@@ -0,0 +1,118 @@
+import logging
+from datetime import time as datetime_time
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from attendance.models import Attendance
+
+from . import summary
+from .image_store import save_attendance_image_bytes
+
+logger = logging.getLogger(__name__)
+
+CUTOFF_TIME = datetime_time(9, 0)
+LATE_TIME = datetime_time(9, 30)
+
+
+def compute_status(now_time):
+    """Return the attendance status for a check-in at ``now_time``."""
+    if now_time <= CUTOFF_TIME:
+        return "on_time"
+    elif now_time <= LATE_TIME:
+        return "late"
+    return "late"
+
+
+def student_payload(student, attendance=None):
+    """Common response fields shared by every check-in endpoint."""
+    return {
+        "name": student.name,
+        "roll_no": student.roll_no,
+        "class": student.class_group.name if student.class_group else None,
+        "batch": student.batch.name if student.batch else None,
+        "department": student.department.name if student.department else None,
+        "time": attendance.time.isoformat() if attendance and attendance.time else None,
+        "status": attendance.status if attendance else "absent",
+    }
+
+
+def mark_present(student):
+    """Create today's attendance row for ``student``.
+
+    Returns ``(attendance, created)``. Two kiosks submitting the same student at
+    once both end up with the single row allowed by ``unique_together``.
+    The class's DailyClassSummary is updated in the same transaction.
+    """
+    today = timezone.localdate()
+    now_time = timezone.localtime(timezone.now()).time()
+    with transaction.atomic():
+        summary.lock(today, [student.class_group_id])
+        attendance, created = Attendance.objects.get_or_create(
+            student=student,
+            date=today,
+            defaults={
+                "time": now_time,
+                "status": compute_status(now_time),
+                "already_marked": True,
+            },
+        )
+        if created:
+            summary.apply(today, student.class_group_id, None, attendance.status)
+    return attendance, created
+
+
+def mark_present_bulk(students):
+    """Create today's attendance rows for many students in one INSERT.
+
+    Returns ``(created, existing)``: new Attendance objects for students not
+    yet marked, and ``{student_id: attendance}`` for those already marked.
+    """
+    today = timezone.localdate()
+    now_time = timezone.localtime(timezone.now()).time()
+    with transaction.atomic():
+        # The summary locks keep other writers of these classes out between
+        # the lookup and the INSERT. Students without a class take no lock, so
+        # a concurrent check-in can still win one of their rows: the plain
+        # INSERT (no INSERT IGNORE, which hides other errors too) then fails
+        # as a whole and is retried against a fresh lookup.
+        summary.lock(today, [student.class_group_id for student in students])
+        for attempt in range(3):
+            existing = {
+                att.student_id: att
+                for att in Attendance.objects.filter(date=today, student__in=students)
+            }
+            created = [
+                Attendance(
+                    student=student,
+                    date=today,
+                    time=now_time,
+                    status=compute_status(now_time),
+                    already_marked=True,
+                )
+                for student in students
+                if student.id not in existing
+            ]
+            try:
+                with transaction.atomic():
+                    Attendance.objects.bulk_create(created)
+                break
+            except IntegrityError:
+                if attempt == 2:
+                    raise
+        summary.apply_created(created)
+    return created, existing
+
+
+def store_attendance_image(data, roll_no, attendance_date):
+    """Persist the check-in snapshot once, after a successful match.
+
+    Failures are logged, never raised: the attendance row is already written.
+    """
+    try:
+        saved_path = save_attendance_image_bytes(data, roll_no, attendance_date)
+        logger.info(f"Saved attendance image to {saved_path}")
+        return saved_path
+    except Exception as e:
+        logger.exception("Failed to save attendance image: %s", e)
+        return None
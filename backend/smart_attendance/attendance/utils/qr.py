@@ -0,0 +1,56 @@
+"""Server-side QR decoding of student cards held up in a check-in frame.
+
+Student QR codes encode the roll number (see ``Student.save``). pyzbar (and
+the zbar shared library) is only imported on first use, like face_lib, so
+processes that never decode QR codes don't need it.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+QR_MAX_SIDE = 1280
+
+
+def parse_region(value):
+    """Parse ``"x0,y0,x1,y1"`` (fractions of the frame) into a tuple.
+
+    Raises ValueError for anything else.
+    """
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("qr_region must be x0,y0,x1,y1")
+    x0, y0, x1, y1 = parts
+    if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+        raise ValueError("qr_region must be fractions with x0 < x1 and y0 < y1")
+    return x0, y0, x1, y1
+
+
+def decode_roll_no(data, region=None):
+    """Roll number from the first QR code in an encoded image, or None.
+
+    ``region`` (fractions, see ``parse_region``) is where the kiosk's on-screen
+    guide asks students to hold the card; zbar scans that crop first, which
+    is much cheaper than the whole frame, and falls back to the whole frame.
+    """
+    from pyzbar.pyzbar import ZBarSymbol, decode
+
+    with Image.open(BytesIO(data)) as img:
+        img.draft("L", (QR_MAX_SIDE, QR_MAX_SIDE))
+        gray = img.convert("L")
+    gray.thumbnail((QR_MAX_SIDE, QR_MAX_SIDE), Image.BILINEAR)
+
+    candidates = []
+    if region is not None:
+        x0, y0, x1, y1 = region
+        width, height = gray.size
+        candidates.append(gray.crop((
+            int(x0 * width), int(y0 * height), int(x1 * width), int(y1 * height),
+        )))
+    candidates.append(gray)
+
+    for candidate in candidates:
+        for symbol in decode(candidate, symbols=[ZBarSymbol.QRCODE]):
+            text = symbol.data.decode("utf-8", errors="replace").strip()
+            if text:
+                return text
+    return None
@@ -0,0 +1,199 @@
+"""Building blocks for bulk (re-)encoding of the student roster.
+
+Used by the ``reembed_faces`` and ``fix_face_encodings`` management commands:
+chunks of students are encoded in a process pool of their own (sized for a
+batch job, not for the web workers) while the parent writes finished chunks
+(``write_encodings``), records a checkpoint so an interrupted run resumes where
+it stopped, and reports throughput and ETA.
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from . import face_lib
+from .face_utils import encode_chips, get_face_registration
+
+
+def encode_students(items):
+    """Encode one chunk in a worker process.
+
+    ``items`` is a list of ``(student_id, chip, image_path)``. Students with a
+    stored chip go through a single batched descriptor call; the others run
+    full registration on their photo, which also yields a chip to store.
+    Returns ``(student_id, encoding, new_chip, landmarks)`` per item, with
+    ``encoding`` None when no face could be encoded.
+    """
+    results = {}
+    with_chip = [(pk, chip) for pk, chip, _ in items if chip]
+    if with_chip:
+        encodings = encode_chips([chip for _, chip in with_chip])
+        for (pk, _), encoding in zip(with_chip, encodings):
+            results[pk] = (pk, encoding, None, None)
+    for pk, chip, path in items:
+        if pk in results:
+            continue
+        if not path:
+            results[pk] = (pk, None, None, None)
+            continue
+        try:
+            results[pk] = (pk, *get_face_registration(path))
+        except Exception as e:
+            print(f"Error encoding student {pk} from {path}: {e}")
+            results[pk] = (pk, None, None, None)
+    return [results[pk] for pk, _, _ in items]
+
+
+def student_chunks(queryset, chunk_size, limit=None):
+    """Yield ``(last_id, items)`` chunks of ``encode_students`` input for the
+    (first ``limit``) students of ``queryset`` in id order, with their stored chips."""
+    from accounts.models import FaceChip, Student
+
+    storage = Student._meta.get_field("image").storage
+
+    def load(batch):
+        ids = [pk for pk, _ in batch]
+        chips = dict(FaceChip.objects.filter(student_id__in=ids).values_list("student_id", "chip"))
+        items = [(pk, bytes(chips[pk]) if pk in chips else None, path) for pk, path in batch]
+        return ids[-1], items
+
+    rows = queryset.order_by("id").values_list("id", "image")
+    if limit is not None:
+        rows = rows[:limit]
+    batch = []
+    for pk, image in rows.iterator(chunk_size=chunk_size):
+        batch.append((pk, storage.path(image) if image else None))
+        if len(batch) == chunk_size:
+            yield load(batch)
+            batch = []
+    if batch:
+        yield load(batch)
+
+
+def store_chips(rows):
+    """Upsert ``(student_id, chip, landmarks)`` rows into accounts.FaceChip."""
+    from accounts.models import FaceChip
+
+    objs = [FaceChip(student_id=pk, chip=chip, landmarks=landmarks) for pk, chip, landmarks in rows]
+    if not objs:
+        return
+    options = {"update_conflicts": True, "update_fields": ["chip", "landmarks"]}
+    if connection.features.supports_update_conflicts_with_target:
+        options["unique_fields"] = ["student"]
+    FaceChip.objects.bulk_create(objs, **options)
+
+
+def write_encodings(last_id, results, version, checkpoint, progress):
+    """Store one finished ``encode_students`` chunk and checkpoint after it.
+
+    bulk_update writes only the encoding columns: no QR regeneration and no
+    second encoding pass from Student.save(). It also skips the signals that
+    keep the encoding store in sync, so callers publish it (``gallery.invalidate``)
+    themselves. Students without a usable encoding count as ``progress.failed``.
+    Returns the number of students written.
+    """
+    from accounts.models import Student, encoding_is_valid
+
+    updates = [
+        Student(id=pk, face_encoding=encoding, encoding_version=version, has_face_encoding=True)
+        for pk, encoding, _, _ in results
+        if encoding_is_valid(encoding)
+    ]
+    Student.objects.bulk_update(updates, ["face_encoding", "encoding_version", "has_face_encoding"])
+    store_chips([(pk, chip, landmarks) for pk, _, chip, landmarks in results if chip])
+    checkpoint.save(last_id)
+    progress.failed += len(results) - len(updates)
+    progress.update(len(results), failed=progress.failed)
+    return len(updates)
+
+
+def run_chunks(fn, chunks, workers, on_result):
+    """Apply ``fn(payload)`` to every ``(key, payload)`` of ``chunks`` in a
+    process pool, calling ``on_result(key, result)`` in submission order (so a
+    checkpoint taken in ``on_result`` never skips unfinished chunks).
+    ``workers <= 0`` runs inline."""
+    if workers <= 0:
+        for key, payload in chunks:
+            on_result(key, fn(payload))
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=face_lib.load,
+    ) as executor:
+        pending = deque()
+        for key, payload in chunks:
+            pending.append((key, executor.submit(fn, payload)))
+            # Two chunks per process keeps every worker busy while results are written
+            while len(pending) >= 2 * workers:
+                key, future = pending.popleft()
+                on_result(key, future.result())
+        while pending:
+            key, future = pending.popleft()
+            on_result(key, future.result())
+
+
+class Checkpoint:
+    """Last processed student id of a bulk job, kept under FACE_DATA_DIR.
+
+    ``run_key`` identifies the run (e.g. the target encoder version); a
+    checkpoint written for another key is ignored.
+    """
+
+    def __init__(self, name, run_key=""):
+        self.path = os.path.join(settings.FACE_DATA_DIR, "checkpoints", f"{name}.json")
+        self.run_key = run_key
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+        return data.get("last_id", 0) if data.get("run_key") == self.run_key else 0
+
+    def save(self, last_id):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"run_key": self.run_key, "last_id": last_id}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Progress:
+    """``done/total``, throughput and ETA lines for long-running commands."""
+
+    def __init__(self, total, write):
+        self.total = total
+        self.write = write
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count, **extra):
+        self.done += count
+        rate = self.rate
+        remaining = (self.total - self.done) / rate if rate else 0
+        details = "".join(f" {key}={value}" for key, value in extra.items())
+        pct = 100 * self.done / self.total if self.total else 100
+        self.write(
+            f"{self.done}/{self.total} ({pct:.1f}%) {rate:.1f} students/s "
+            f"ETA {int(remaining // 60)}m{int(remaining % 60):02d}s{details}"
+        )
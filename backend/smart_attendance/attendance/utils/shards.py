@@ -0,0 +1,161 @@
+"""Class-, department- and batch-scoped slices of the face gallery.
+
+A kiosk outside a classroom only has to tell apart the few hundred students
+who can be there (``Kiosk.current_scope``). A shard copies just their rows out
+of the memory-mapped encoding store into a small in-process matrix, so
+identification is an exact scan of a few hundred vectors instead of a search
+over the whole institution, with correspondingly fewer chances of a false
+match.
+
+Shards are cached per process and rebuilt when the store version changes or
+after FACE_SHARD_TTL seconds (class membership changes). ``start_prewarm()``
+runs a daemon thread that builds the shards of classes starting within
+FACE_SHARD_PREWARM_MINUTES on any kiosk's timetable, so the first student of
+a period doesn't pay for it.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .gallery import get_gallery, get_match_tolerance
+
+logger = logging.getLogger(__name__)
+
+SCOPE_FIELDS = {
+    "class_group": "class_group_id",
+    "department": "department_id",
+    "batch": "batch_id",
+}
+
+_lock = threading.Lock()
+_shards = OrderedDict()  # scope -> GalleryShard
+_prewarm_thread = None
+
+
+class GalleryShard:
+    """Rows of one scope's students, with EncodingGallery's identify()."""
+
+    def __init__(self, scope, version, student_ids, vectors):
+        self.scope = scope
+        self.version = version
+        self.student_ids = student_ids
+        self.vectors = vectors
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def identify(self, encoding, tolerance=None):
+        """``(student_id, distance)`` of the closest student in the shard;
+        ``student_id`` is None when empty or above ``tolerance``."""
+        if not len(self):
+            return None, None
+        tolerance = get_match_tolerance() if tolerance is None else tolerance
+        distances = np.linalg.norm(self.vectors - np.asarray(encoding, dtype=np.float32), axis=1)
+        best = int(np.argmin(distances))
+        best_distance = float(distances[best])
+        if best_distance > tolerance:
+            return None, best_distance
+        return int(self.student_ids[best]), best_distance
+
+
+def scope_student_ids(scope):
+    from accounts.models import Student
+
+    kind, pk = scope
+    return list(Student.objects.filter(**{SCOPE_FIELDS[kind]: pk}).values_list("id", flat=True))
+
+
+def build_shard(scope):
+    gallery = get_gallery()
+    store = gallery.store
+    mask = np.isin(np.asarray(store.labels), scope_student_ids(scope))
+    rows = np.flatnonzero(mask)
+    vectors = store.take(rows)
+    shard = GalleryShard(scope, gallery.version, np.asarray(store.labels)[rows], vectors)
+    logger.info("Built face gallery shard %s:%s with %d encodings", scope[0], scope[1], len(shard))
+    return shard
+
+
+def get_shard(scope):
+    """Cached shard for ``(kind, pk)``, rebuilt if stale."""
+    version = get_gallery().version
+    ttl = getattr(settings, "FACE_SHARD_TTL", 300)
+    with _lock:
+        shard = _shards.get(scope)
+        if shard is not None and shard.version == version and time.monotonic() - shard.built_at < ttl:
+            _shards.move_to_end(scope)
+            return shard
+    shard = build_shard(scope)
+    with _lock:
+        _shards[scope] = shard
+        _shards.move_to_end(scope)
+        while len(_shards) > getattr(settings, "FACE_SHARD_CACHE_SIZE", 64):
+            _shards.popitem(last=False)
+    return shard
+
+
+def gallery_for_kiosk(code):
+    """The shard a kiosk should search right now, or the whole gallery when
+    the kiosk is unknown or has no scope."""
+    from attendance.models import Kiosk
+
+    kiosk = Kiosk.objects.filter(code=code, is_active=True).prefetch_related("schedule").first() if code else None
+    scope = kiosk.current_scope() if kiosk else None
+    return get_shard(scope) if scope else get_gallery()
+
+
+def upcoming_scopes(now=None):
+    """Class-group scopes on any kiosk timetable starting within the
+    pre-warm window (or already running)."""
+    from attendance.models import KioskSchedule
+
+    now = timezone.localtime(now or timezone.now())
+    ahead = now + timedelta(minutes=getattr(settings, "FACE_SHARD_PREWARM_MINUTES", 10))
+    scopes = set()
+    entries = KioskSchedule.objects.filter(weekday=now.weekday(), kiosk__is_active=True)
+    for entry in entries.only("start_time", "end_time", "class_group_id"):
+        start = datetime.combine(now.date(), entry.start_time, tzinfo=now.tzinfo)
+        end = datetime.combine(now.date(), entry.end_time, tzinfo=now.tzinfo)
+        if start <= ahead and end >= now:
+            scopes.add(("class_group", entry.class_group_id))
+    return scopes
+
+
+def prewarm():
+    """Build (or refresh) the shards of upcoming classes; returns how many."""
+    scopes = upcoming_scopes()
+    for scope in scopes:
+        get_shard(scope)
+    return len(scopes)
+
+
+def _prewarm_loop():
+    from django.db import close_old_connections
+
+    interval = getattr(settings, "FACE_SHARD_PREWARM_INTERVAL", 60)
+    while True:
+        try:
+            prewarm()
+        except Exception:
+            logger.exception("Face gallery shard pre-warm failed")
+        finally:
+            close_old_connections()
+        time.sleep(interval)
+
+
+def start_prewarm():
+    """Start the pre-warm thread once per process."""
+    global _prewarm_thread
+    with _lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(
+                target=_prewarm_loop, name="face-shard-prewarm", daemon=True
+            )
+            _prewarm_thread.start()
@@ -0,0 +1,119 @@
+"""Incremental maintenance of attendance.DailyClassSummary.
+
+Every code path that creates an Attendance row or changes its status goes
+through here inside its transaction:
+
+    with transaction.atomic():
+        summary.lock(day, [class_group_id])      # before writing Attendance
+        ... create / update Attendance ...
+        summary.apply(day, class_group_id, old_status, new_status)
+
+Locking the summary row first gives every writer of a class the same lock
+order (summary rows in class id order, then attendance rows), so concurrent
+kiosks and class photos don't double count, and the counters are changed
+with F() increments, never read-modify-write.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+COUNTED = ("present", "on_time", "late")
+
+
+def counts_for(status):
+    """``{"present": 0|1, "on_time": 0|1, "late": 0|1}`` for one status."""
+    return {
+        "present": int(status in ("on_time", "late")),
+        "on_time": int(status == "on_time"),
+        "late": int(status == "late"),
+    }
+
+
+def lock(day, class_group_ids):
+    """Create (if missing) and row-lock the summary rows of ``class_group_ids``
+    for ``day``. Must run inside ``transaction.atomic()``."""
+    from attendance.models import DailyClassSummary
+
+    rows = DailyClassSummary.objects.filter(date=day)
+    # Sorted ids: concurrent writers lock shared classes in the same order
+    for pk in sorted({pk for pk in class_group_ids if pk}):
+        # Plain existence check first: no INSERT IGNORE (its shared lock upgraded
+        # by the FOR UPDATE below deadlocks two check-ins on MySQL) and no
+        # FOR UPDATE gap locks on a missing row
+        if not rows.filter(class_group_id=pk).exists():
+            try:
+                with transaction.atomic():
+                    DailyClassSummary.objects.create(date=day, class_group_id=pk)
+            except IntegrityError:
+                pass  # created concurrently: wait for its writer below
+        rows.select_for_update().get(class_group_id=pk)
+
+
+def add(day, class_group_id, delta):
+    """Add ``delta`` (a Counter over COUNTED) to one summary row."""
+    from attendance.models import DailyClassSummary
+
+    changes = {field: F(field) + delta[field] for field in COUNTED if delta[field]}
+    if not class_group_id or not changes:
+        return
+    updated = DailyClassSummary.objects.filter(date=day, class_group_id=class_group_id).update(**changes)
+    if not updated:
+        DailyClassSummary.objects.create(
+            date=day, class_group_id=class_group_id, **{field: delta[field] for field in COUNTED}
+        )
+
+
+def apply(day, class_group_id, old_status, new_status):
+    """Record one attendance status change (``old_status`` None for a new row)."""
+    delta = Counter(counts_for(new_status))
+    delta.subtract(counts_for(old_status))
+    add(day, class_group_id, delta)
+
+
+def apply_created(attendances):
+    """Record freshly created Attendance rows (``student`` must be loaded)."""
+    deltas = {}
+    for att in attendances:
+        key = (att.date, att.student.class_group_id)
+        deltas.setdefault(key, Counter()).update(counts_for(att.status))
+    for (day, class_group_id), delta in deltas.items():
+        add(day, class_group_id, delta)
+
+
+@transaction.atomic
+def rebuild(date_from=None, date_to=None):
+    """Recompute the summary rows of a date range (everything by default)
+    from Attendance; returns the number of rows written."""
+    from attendance.models import Attendance, DailyClassSummary
+
+    attendance = Attendance.objects.filter(student__class_group__isnull=False)
+    summaries = DailyClassSummary.objects.all()
+    if date_from:
+        attendance = attendance.filter(date__gte=date_from)
+        summaries = summaries.filter(date__gte=date_from)
+    if date_to:
+        attendance = attendance.filter(date__lte=date_to)
+        summaries = summaries.filter(date__lte=date_to)
+    rows = (
+        attendance.values("date", "student__class_group")
+        .annotate(
+            present=Count("id", filter=Q(status__in=("on_time", "late"))),
+            on_time=Count("id", filter=Q(status="on_time")),
+            late=Count("id", filter=Q(status="late")),
+        )
+        .order_by()
+    )
+    summaries.delete()
+    objs = [
+        DailyClassSummary(
+            date=row["date"],
+            class_group_id=row["student__class_group"],
+            present=row["present"],
+            on_time=row["on_time"],
+            late=row["late"],
+        )
+        for row in rows
+    ]
+    DailyClassSummary.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
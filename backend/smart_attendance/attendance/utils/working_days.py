@@ -0,0 +1,56 @@
+"""Working-day calendar: every date that is neither a WeeklyOff weekday nor
+a Holiday. Absence counts are measured against it, so weekends and holidays
+never count as absences."""
+from datetime import timedelta
+
+from django.db.models import Q
+
+
+class WorkingCalendar:
+    """Weekly offs and holidays, loaded once (two small queries).
+
+    With ``start``/``end`` only the holidays inside that range are loaded.
+    """
+
+    def __init__(self, start=None, end=None):
+        from attendance.models import Holiday, WeeklyOff
+
+        self.weekly_offs = set(WeeklyOff.objects.values_list("weekday", flat=True))
+        holidays = Holiday.objects.all()
+        if start:
+            holidays = holidays.filter(date__gte=start)
+        if end:
+            holidays = holidays.filter(date__lte=end)
+        self.holidays = set(holidays.values_list("date", flat=True))
+
+    def is_working(self, day):
+        return day.weekday() not in self.weekly_offs and day not in self.holidays
+
+    def split(self, start, end):
+        """``(working, off)`` lists of the dates from ``start`` to ``end`` inclusive."""
+        working, off = [], []
+        day = start
+        while day <= end:
+            (working if self.is_working(day) else off).append(day)
+            day += timedelta(days=1)
+        return working, off
+
+    def off_days_q(self, field="date"):
+        """Q matching rows whose ``field`` is not a working day, or None if every day is."""
+        q = Q()
+        if self.weekly_offs:
+            # iso_week_day: Monday=1 ... Sunday=7; date.weekday(): Monday=0
+            q |= Q(**{f"{field}__iso_week_day__in": sorted(wd + 1 for wd in self.weekly_offs)})
+        if self.holidays:
+            q |= Q(**{f"{field}__in": sorted(self.holidays)})
+        return q or None
+
+
+def split_range(start, end):
+    """``(working, off)`` lists of the dates from ``start`` to ``end`` inclusive."""
+    return WorkingCalendar(start, end).split(start, end)
+
+
+def count(start, end):
+    """Number of working days from ``start`` to ``end`` inclusive."""
+    return len(split_range(start, end)[0])
@@ -1,28 +1,37 @@
+from PIL import UnidentifiedImageError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .utils.face_utils import match_face
-from accounts.models import Student
-from .models import Attendance, AdminSetting, AdminToken
+from .utils import encode_batcher, face_worker, working_days
+from .utils.encoding_cache import get_cache, get_or_encode, submit_encode
+from .utils.class_photo import AMBIGUOUS, MATCHED, ClassGallery, assign_faces
+from .utils.face_utils import get_all_faces, nearest_student
+from .utils.gallery import get_match_tolerance
+from .utils.shards import gallery_for_kiosk
+from .utils.quality import FrameRejected
+from .utils.qr import decode_roll_no, parse_region
+from .utils.marking import mark_present, mark_present_bulk, store_attendance_image, student_payload
+from accounts.models import ClassGroup, FaceReference, Student
+from .models import Attendance, AdminSetting, AdminToken, DailyClassSummary
 from django.utils import timezone
-import os
-from django.db.models import Count
+from django.db.models import Count, ExpressionWrapper, F, FilteredRelation, IntegerField, Max, Min, Q, Value
+from rest_framework import pagination
 from django.utils import timezone
 from datetime import timedelta, date
 from accounts.models import Student
+import csv
+import itertools
+import tempfile
 import openpyxl
-from django.http import HttpResponse
-from datetime import time as datetime_time
-import shutil
+from django.http import FileResponse, StreamingHttpResponse
 from pathlib import Path
 
-from .utils.image_store import save_attendance_image_from_path
 from django.conf import settings
 from django.contrib.auth.hashers import make_password, check_password
 import secrets
 import logging
 logger = logging.getLogger(__name__)
 
-from datetime import timedelta, date, datetime, time as datetime_time, timezone as dt_timezone
+from datetime import timedelta, date, datetime, timezone as dt_timezone
 from django.utils import timezone
 NEPAL_TZ = timezone.get_fixed_timezone(5 * 60 + 45)  # UTC+5:45
 
@@ -70,8 +79,40 @@ class AttendanceStatus(APIView):
         
         return Response(response_data)
 
+class RosterCursorPagination(pagination.CursorPagination):
+    """Opt-in cursor pagination: unpaginated unless the client sends page_size.
+
+    Cursor (keyset) pages cost the same however deep the client pages, unlike
+    page-number OFFSETs over the whole roster.
+    """
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = "id"
+
+
+def _int_param(params, name):
+    """Optional integer query param; raises ValueError on garbage."""
+    value = params.get(name)
+    return int(value) if value not in (None, "") else None
+
+
+ROSTER_STATUSES = ("present", "on_time", "late", "absent")
+
+
 class AttendanceStatusList(APIView):
-    """List attendance status for all students for a given date (defaults to today)"""
+    """List attendance status for all students for a given date (defaults to today)
+
+    Query params: date (YYYY-MM-DD), class_group, department, batch (ids),
+    status (present | on_time | late | absent), page_size and cursor.
+
+    Always exactly one query, however many students: each student is LEFT
+    JOINed to its attendance row of that day (at most one, unique on
+    student+date) and read with values(), so no model instances and no
+    per-student lookups.
+    """
+    pagination_class = RosterCursorPagination
+
     def get(self, request):
         # Accept optional `date` query param (YYYY-MM-DD). If provided and valid, use it.
         date_str = request.query_params.get("date")
@@ -83,26 +124,57 @@ class AttendanceStatusList(APIView):
         except Exception:
             # invalid format -> respond with 400
             return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
-        
-        students = Student.objects.select_related('class_group', 'batch', 'department').all()
-        
+
+        try:
+            scope = {
+                field: _int_param(request.query_params, name)
+                for name, field in (
+                    ("class_group", "class_group_id"),
+                    ("department", "department_id"),
+                    ("batch", "batch_id"),
+                )
+            }
+        except ValueError:
+            return Response({"error": "class_group, department and batch must be ids"}, status=400)
+        status_filter = request.query_params.get("status")
+        if status_filter and status_filter not in ROSTER_STATUSES:
+            return Response({"error": f"status must be one of {', '.join(ROSTER_STATUSES)}"}, status=400)
+
+        students = Student.objects.annotate(
+            day_att=FilteredRelation("attendance", condition=Q(attendance__date=today)),
+        ).filter(**{field: pk for field, pk in scope.items() if pk is not None})
+        if status_filter == "absent":
+            students = students.filter(Q(day_att__isnull=True) | Q(day_att__status="absent"))
+        elif status_filter == "present":
+            students = students.filter(day_att__status__in=("on_time", "late"))
+        elif status_filter:
+            students = students.filter(day_att__status=status_filter)
+        rows = students.values(
+            "id", "roll_no", "name",
+            "class_group__name", "batch__name", "department__name",
+            "day_att__id", "day_att__time", "day_att__status",
+        ).order_by("id")
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rows, request, view=self)
+
         result = []
-        for student in students:
-            att = Attendance.objects.filter(student=student, date=today).first()
-            exists = att is not None
-            
+        for row in (page if page is not None else rows):
+            att_id = row["day_att__id"]
             result.append({
-                "id": att.id if att else student.id,
-                "roll_no": student.roll_no,
-                "name": student.name,
-                "class": student.class_group.name if student.class_group else None,
-                "batch": student.batch.name if student.batch else None,
-                "department": student.department.name if student.department else None,
-                "alreadyMarked": exists,
-                "time": att.time.isoformat() if att and att.time else None,
-                "status": att.status if att else "absent",
+                "id": att_id if att_id else row["id"],
+                "roll_no": row["roll_no"],
+                "name": row["name"],
+                "class": row["class_group__name"],
+                "batch": row["batch__name"],
+                "department": row["department__name"],
+                "alreadyMarked": att_id is not None,
+                "time": row["day_att__time"].isoformat() if row["day_att__time"] else None,
+                "status": row["day_att__status"] or "absent",
             })
-        
+
+        if page is not None:
+            return paginator.get_paginated_response(result)
         return Response({"results": result})
 
 class MarkAttendance(APIView):
@@ -129,177 +201,567 @@ class MarkAttendance(APIView):
             # Return existing attendance without modification
             return Response({
                 "message": "Attendance already marked today",
-                "name": student.name,
-                "roll_no": student.roll_no,
-                "class": student.class_group.name if student.class_group else None,
-                "batch": student.batch.name if student.batch else None,
-                "department": student.department.name if student.department else None,
-                "time": existing_att.time.isoformat() if existing_att.time else None,
-                "status": existing_att.status,
+                **student_payload(student, existing_att),
             })
         
-        if not student.face_encoding:
+        if not student.has_face_encoding:
             print(f"Error: Student {student.roll_no} has no face encoding. Register via /register/ API or fix with management command.")
             return Response({"error": "Student has no face encoding. Register via /register/ API or fix with management command."}, status=400)
 
-        # Ensure directory exists
-        os.makedirs("media/temp", exist_ok=True)
-
-        # Save uploaded image temporarily
-        path = f"media/temp/{roll_no}.jpg"
-        with open(path, 'wb+') as f:
-            for chunk in image.chunks():
-                f.write(chunk)
+        # Decode straight from the uploaded buffer; nothing touches disk until a match
+        data = image.read()
 
-        # Match face with student
+        # Match face with student (encoding runs in the face worker pool)
         try:
             print(f"Matching face for student: {student.name} ({student.roll_no})")
-            matched_student = match_face(path, [student])
-            print(f"Match result: {matched_student}")
-            if matched_student == "no_face":
+            unknown_enc, _ = get_or_encode(data)
+            if unknown_enc is None:
                 print("Error: No face detected in image")
-                return Response({"error": "No face detected in image"}, status=400)
+                return Response({"error": "No face detected in image", "reason": "no_face"}, status=400)
+            matched_student, distance = nearest_student(unknown_enc, [student])
+            if distance is None or distance > get_match_tolerance():
+                matched_student = None
+            print(f"Match result: {matched_student} (distance={distance})")
+        except FrameRejected as e:
+            return Response({"error": e.message, "reason": e.reason}, status=400)
+        except face_worker.FaceWorkerBusy:
+            return Response({"error": "Face service is busy, please retry"}, status=503)
+        except face_worker.FaceWorkerTimeout:
+            return Response({"error": "Face processing timed out, please retry"}, status=504)
         except Exception as e:
             print(f"Exception during face matching: {e}")
             return Response({"error": f"Error processing image: {str(e)}"}, status=500)
 
         if matched_student:
-            today = timezone.localdate()
-            now_time = timezone.localtime(timezone.now()).time()
-            
-            # Compute status based on time
-            CUTOFF_TIME = datetime_time(9, 0)
-            LATE_TIME = datetime_time(9, 30)
-            if now_time <= CUTOFF_TIME:
-                status = "on_time"
-            elif now_time <= LATE_TIME:
-                status = "late"
-            else:
-                status = "late"
-            
-            # Create attendance record
-            attendance = Attendance.objects.create(
-                student=student,
-                date=today,
-                time=now_time,
-                status=status,
-                already_marked=True,
-            )
-            
-            try:
-                saved_path = save_attendance_image_from_path(path, roll_no)
-                logger.info(f"Saved attendance image to {saved_path}")
-            except Exception as e:
-                logger.exception("Failed to save attendance image: %s", e)
-            finally:
-                try:
-                    if os.path.exists(path):
-                        os.remove(path)
-                except Exception:
-                    pass
-
-            # NEW: copy/move saved image into weekday folder and prune older files
-            try:
-                if saved_path and os.path.exists(saved_path):
-                    weekday = attendance.date.strftime("%A")  # e.g., 'Monday'
-                    dest_dir = os.path.join(settings.MEDIA_ROOT, "attendance_weekday", weekday)
-                    os.makedirs(dest_dir, exist_ok=True)
-                    dest_path = os.path.join(dest_dir, f"{student.roll_no}.jpg")
-                    # copy latest image (overwrite)
-                    shutil.copy2(saved_path, dest_path)
-
-                    # prune files older than 7 days in this weekday folder
-                    now_ts = datetime.now().timestamp()
-                    seven_days = 7 * 24 * 3600
-                    for fname in os.listdir(dest_dir):
-                        fpath = os.path.join(dest_dir, fname)
-                        try:
-                          if os.path.isfile(fpath):
-                            mtime = os.path.getmtime(fpath)
-                            if (now_ts - mtime) > seven_days:
-                              os.remove(fpath)
-                        except Exception:
-                          logger.exception("Failed to prune file %s", fpath)
-            except Exception:
-                logger.exception("Failed to copy/prune weekday attendance images")
+            attendance, _ = mark_present(student)
+            store_attendance_image(data, roll_no, attendance.date)
+            FaceReference.add_checkin(student, unknown_enc, distance)
 
             print(f"Attendance marked for {student.name}")
             return Response({
                 "message": f"Attendance marked for {student.name}",
-                "name": student.name,
-                "roll_no": student.roll_no,
-                "class": student.class_group.name if student.class_group else None,
-                "batch": student.batch.name if student.batch else None,
-                "department": student.department.name if student.department else None,
-                "time": attendance.time.isoformat() if attendance.time else None,
-                "status": attendance.status,
+                **student_payload(student, attendance),
             })
         else:
             print("Error: Face did not match")
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except Exception:
-                pass
             return Response({"error": "Face did not match"}, status=400)
 
 
+class IdentifyAttendance(APIView):
+    """
+    POST /api/attendance/identify/
+    Body (multipart): image, optional kiosk (Kiosk.code)
+    QR-less check-in: the photo is matched against every enrolled student in
+    one vectorized distance computation over the in-memory encoding gallery.
+    With a registered kiosk only the students of its current class (or
+    department/batch) are searched, see utils.shards.
+    """
+    def post(self, request):
+        image = request.FILES.get('image')
+        if not image:
+            return Response({"error": "Image is required"}, status=400)
+
+        data = image.read()
+        try:
+            unknown_enc, _ = get_or_encode(data)
+            if unknown_enc is None:
+                return Response({"error": "No face detected in image", "reason": "no_face"}, status=400)
+            student_id, distance = gallery_for_kiosk(request.data.get('kiosk')).identify(unknown_enc)
+        except FrameRejected as e:
+            return Response({"error": e.message, "reason": e.reason}, status=400)
+        except face_worker.FaceWorkerBusy:
+            return Response({"error": "Face service is busy, please retry"}, status=503)
+        except face_worker.FaceWorkerTimeout:
+            return Response({"error": "Face processing timed out, please retry"}, status=504)
+        except Exception as e:
+            logger.exception("Exception during face identification: %s", e)
+            return Response({"error": f"Error processing image: {str(e)}"}, status=500)
+
+        if student_id is None:
+            return Response({"error": "Face did not match any enrolled student"}, status=400)
+
+        student = Student.objects.select_related('class_group', 'batch', 'department').get(pk=student_id)
+        attendance, created = mark_present(student)
+        if not created:
+            return Response({
+                "message": "Attendance already marked today",
+                **student_payload(student, attendance),
+                "distance": distance,
+            })
+
+        store_attendance_image(data, student.roll_no, attendance.date)
+        FaceReference.add_checkin(student, unknown_enc, distance)
+        return Response({
+            "message": f"Attendance marked for {student.name}",
+            **student_payload(student, attendance),
+            "distance": distance,
+        })
+
+
+class QRFaceAttendance(APIView):
+    """
+    POST /api/attendance/qr-face/
+    Body (multipart): image, optional qr_region ("x0,y0,x1,y1" fractions of the
+    frame where the kiosk asks students to hold their QR card)
+    One frame carries both the student's QR card and face: the face is queued
+    for encoding first, the QR code is decoded and the student looked up while
+    it encodes, then the face is verified against that student.
+    """
+    def post(self, request):
+        image = request.FILES.get('image')
+        if not image:
+            return Response({"error": "Image is required"}, status=400)
+        region = request.data.get('qr_region')
+        try:
+            region = parse_region(region) if region else None
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        data = image.read()
+        try:
+            face_job = submit_encode(data)
+        except FrameRejected as e:
+            return Response({"error": e.message, "reason": e.reason}, status=400)
+        except UnidentifiedImageError:
+            return Response({"error": "Uploaded file is not a valid image", "reason": "invalid_image"}, status=400)
+        except face_worker.FaceWorkerBusy:
+            return Response({"error": "Face service is busy, please retry"}, status=503)
+
+        try:
+            roll_no = decode_roll_no(data, region)
+        except Exception as e:
+            logger.exception("QR decoding failed: %s", e)
+            roll_no = None
+        if not roll_no:
+            face_job.cancel()
+            return Response({"error": "No QR code found in image", "reason": "no_qr"}, status=400)
+
+        student = (
+            Student.objects.select_related('class_group', 'batch', 'department')
+            .prefetch_related('face_references')
+            .filter(roll_no=roll_no)
+            .first()
+        )
+        if student is None:
+            face_job.cancel()
+            return Response({"error": "Student not found", "roll_no": roll_no}, status=404)
+
+        existing_att = Attendance.objects.filter(student=student, date=timezone.localdate()).first()
+        if existing_att:
+            face_job.cancel()
+            return Response({
+                "message": "Attendance already marked today",
+                **student_payload(student, existing_att),
+            })
+
+        try:
+            unknown_enc, _ = encode_batcher.wait(face_job)
+            if unknown_enc is None:
+                return Response({"error": "No face detected in image", "reason": "no_face"}, status=400)
+            matched_student, distance = nearest_student(unknown_enc, [student])
+        except FrameRejected as e:
+            return Response({"error": e.message, "reason": e.reason}, status=400)
+        except UnidentifiedImageError:
+            return Response({"error": "Uploaded file is not a valid image", "reason": "invalid_image"}, status=400)
+        except face_worker.FaceWorkerBusy:
+            return Response({"error": "Face service is busy, please retry"}, status=503)
+        except face_worker.FaceWorkerTimeout:
+            return Response({"error": "Face processing timed out, please retry"}, status=504)
+        except Exception as e:
+            logger.exception("Exception during face matching: %s", e)
+            return Response({"error": f"Error processing image: {str(e)}"}, status=500)
+
+        if matched_student is None:
+            return Response({"error": "Student has no face encoding. Register via /register/ API or fix with management command."}, status=400)
+        if distance > get_match_tolerance():
+            return Response({"error": "Face did not match", "roll_no": roll_no}, status=400)
+
+        attendance, created = mark_present(student)
+        if created:
+            store_attendance_image(data, roll_no, attendance.date)
+            FaceReference.add_checkin(student, unknown_enc, distance)
+        return Response({
+            "message": f"Attendance marked for {student.name}" if created else "Attendance already marked today",
+            **student_payload(student, attendance),
+            "distance": distance,
+        })
+
+
+class ClassPhotoAttendance(APIView):
+    """
+    POST /api/attendance/class-photo/
+    Body (multipart): class_group (id), images (one or more classroom photos)
+    Marks every recognised student of the class in one pass: all faces of
+    each photo are detected and encoded in one face-worker job, assigned to
+    the class's students through a single distance matrix, and the new
+    attendance rows are written with one bulk INSERT.
+    """
+    def post(self, request):
+        class_group_id = request.data.get('class_group')
+        images = request.FILES.getlist('images') or request.FILES.getlist('image')
+        if not class_group_id or not images:
+            return Response({"error": "class_group and images are required"}, status=400)
+        max_images = getattr(settings, "FACE_CLASS_PHOTO_MAX_IMAGES", 5)
+        if len(images) > max_images:
+            return Response({"error": f"At most {max_images} photos per request"}, status=400)
+        try:
+            class_group = ClassGroup.objects.get(pk=class_group_id)
+        except (ClassGroup.DoesNotExist, ValueError):
+            return Response({"error": "Class not found"}, status=404)
+
+        students = list(
+            Student.objects.filter(class_group=class_group)
+            .select_related('class_group', 'batch', 'department')
+            .prefetch_related('face_references')
+        )
+        gallery = ClassGallery(students)
+        photos = [image.read() for image in images]
+
+        try:
+            faces = face_worker.run_many(
+                get_all_faces, photos,
+                timeout=getattr(settings, "FACE_CLASS_PHOTO_TIMEOUT", 60),
+            )
+        except face_worker.FaceWorkerBusy:
+            return Response({"error": "Face service is busy, please retry"}, status=503)
+        except face_worker.FaceWorkerTimeout:
+            return Response({"error": "Face processing timed out, please retry"}, status=504)
+        except Exception as e:
+            logger.exception("Exception during class photo processing: %s", e)
+            return Response({"error": f"Error processing image: {str(e)}"}, status=500)
+
+        best = {}  # student id -> (student, distance, photo, box)
+        unmatched, ambiguous = [], []
+        for photo, (encodings, boxes) in enumerate(faces):
+            for box, (outcome, detail) in zip(boxes, assign_faces(encodings, gallery)):
+                if outcome == MATCHED:
+                    student, distance = detail
+                    if student.id not in best or distance < best[student.id][1]:
+                        best[student.id] = (student, distance, photo, box)
+                elif outcome == AMBIGUOUS:
+                    ambiguous.append({
+                        "photo": photo,
+                        "box": box,
+                        "candidates": [{"roll_no": s.roll_no, "name": s.name, "distance": d} for s, d in detail],
+                    })
+                else:
+                    unmatched.append({"photo": photo, "box": box, "distance": detail})
+
+        created, existing = mark_present_bulk([entry[0] for entry in best.values()])
+        attendance_by_student = {att.student_id: att for att in created}
+        attendance_by_student.update(existing)
+
+        matched = []
+        for student, distance, photo, box in best.values():
+            matched.append({
+                **student_payload(student, attendance_by_student.get(student.id)),
+                "already_marked": student.id in existing,
+                "distance": distance,
+                "photo": photo,
+                "box": box,
+            })
+
+        return Response({
+            "class": class_group.name,
+            "photos": len(photos),
+            "faces": sum(len(boxes) for _, boxes in faces),
+            "marked": len(created),
+            "matched": matched,
+            "unmatched": unmatched,
+            "ambiguous": ambiguous,
+            "not_seen": [s.roll_no for s in students if s.id not in best],
+        })
+
+
+class ReadinessAPIView(APIView):
+    """
+    GET /api/health/ready/
+    200 once the face models are loaded and warmed in this worker (and its
+    face pool), 503 before that. Point the load balancer's health check here.
+    A probe also starts warming if boot warm-up was disabled.
+    """
+    def get(self, request):
+        ready, details = face_worker.readiness()
+        if not ready:
+            face_worker.start_warm_up()
+        return Response({"ready": ready, **details}, status=200 if ready else 503)
+
+
+class FaceCacheStatsAPIView(APIView):
+    """
+    GET /api/health/face-cache/
+    Hit/miss counters of this worker's encoding cache (repeat submissions
+    that skipped dlib) and the sizes of its encoding batches.
+    """
+    def get(self, request):
+        return Response({**get_cache().stats(), "batching": encode_batcher.stats()})
+
+
+class ClassSummaryAPIView(APIView):
+    """
+    GET /api/attendance/summary/?date=YYYY-MM-DD[&department=<id>][&batch=<id>]
+    Present / on-time / late / absent counts per class for one day (default
+    today), read from DailyClassSummary: two queries whose cost grows with the
+    number of classes, not with the number of attendance rows.
+    """
+    def get(self, request):
+        date_str = request.query_params.get("date")
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else timezone.localdate()
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+        try:
+            department = _int_param(request.query_params, "department")
+            batch = _int_param(request.query_params, "batch")
+        except ValueError:
+            return Response({"error": "department and batch must be ids"}, status=400)
+
+        classes = ClassGroup.objects.all()
+        if department is not None:
+            classes = classes.filter(department_id=department)
+        if batch is not None:
+            classes = classes.filter(batch_id=batch)
+        classes = classes.annotate(students=Count("student")).values("id", "name", "students").order_by("name")
+        counts = {
+            row["class_group_id"]: row
+            for row in DailyClassSummary.objects.filter(date=day).values(
+                "class_group_id", "present", "on_time", "late"
+            )
+        }
+
+        results = []
+        totals = {"students": 0, "present": 0, "on_time": 0, "late": 0, "absent": 0}
+        for cls in classes:
+            row = counts.get(cls["id"], {})
+            entry = {
+                "class_group": cls["id"],
+                "class": cls["name"],
+                "students": cls["students"],
+                "present": row.get("present", 0),
+                "on_time": row.get("on_time", 0),
+                "late": row.get("late", 0),
+            }
+            entry["absent"] = max(0, entry["students"] - entry["present"])
+            for key in totals:
+                totals[key] += entry[key]
+            results.append(entry)
+        return Response({"date": day, "totals": totals, "results": results})
+
+class AbsencePagination(pagination.PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+def _date_range(params, default_days=7):
+    """``(start, end)`` from start/end (YYYY-MM-DD) or the last ``days`` days
+    ending today; raises ValueError on bad input."""
+    end = datetime.strptime(params["end"], "%Y-%m-%d").date() if params.get("end") else timezone.localdate()
+    if params.get("start"):
+        start = datetime.strptime(params["start"], "%Y-%m-%d").date()
+    else:
+        days = int(params.get("days", default_days))
+        if days < 1:
+            raise ValueError("days must be positive")
+        start = end - timedelta(days=days - 1)
+    if start > end:
+        raise ValueError("start is after end")
+    return start, end
+
+
 class MostAbsentAPIView(APIView):
+    """
+    GET /api/attendance/most-absent/
+    Students ranked by absences over a period, most absent first.
+
+    Query params: days (default 7) or start/end (YYYY-MM-DD); class_group
+    (or class_id), department, batch; top (rank only the first N);
+    page/page_size.
+
+    Absences are working days (neither a WeeklyOff nor a Holiday) minus the
+    days the student was on time or late. Counting, subtracting, ordering and
+    paging all happen in one SQL statement (plus the page count and two small
+    calendar lookups): each student is joined only to its attendance rows
+    inside the period (index on student+date), so rows outside the window
+    cost nothing.
+    """
     def get(self, request):
-        days = int(request.query_params.get("days", 7))
-        class_id = request.query_params.get("class_id")  # optional filter
-        end = timezone.localdate()
-        start = end - timedelta(days=days-1)
-        # count present per student in range:
-        present_qs = Attendance.objects.filter(date__range=(start, end))
-        if class_id:
-            present_qs = present_qs.filter(student__class_group_id=class_id)
-        present_counts = present_qs.values('student_id', 'student__roll_no', 'student__name', 'student__class_group__name')\
-                                   .annotate(presents=Count('id'))
-        # build dict by student
-        presents_map = {p['student_id']: p for p in present_counts}
-        # students to evaluate
+        params = request.query_params
+        try:
+            start, end = _date_range(params)
+            class_group = _int_param(params, "class_group")
+            if class_group is None:
+                class_group = _int_param(params, "class_id")
+            department = _int_param(params, "department")
+            batch = _int_param(params, "batch")
+            top = _int_param(params, "top")
+        except ValueError:
+            return Response({"error": "Invalid parameters. Use YYYY-MM-DD dates, a positive days and numeric ids."}, status=400)
+
+        calendar = working_days.WorkingCalendar(start, end)
+        working, _ = calendar.split(start, end)
+        attended = Q(attendance__date__range=(start, end), attendance__status__in=("on_time", "late"))
+        off_days = calendar.off_days_q("attendance__date")
+        if off_days is not None:
+            # A check-in on a holiday neither counts as presence nor offsets an absence
+            attended &= ~off_days
+
         students = Student.objects.all()
-        if class_id:
-            students = students.filter(class_group_id=class_id)
-        total_days = days
-        result = []
-        for s in students:
-            p = presents_map.get(s.id)
-            presents = p['presents'] if p else 0
-            absences = total_days - presents
-            result.append({"roll_no": s.roll_no, "name": s.name, "class": s.class_group and s.class_group.name, "presents": presents, "absences": absences})
-        # sort by absences desc
-        result.sort(key=lambda x: x['absences'], reverse=True)
-        return Response({"period_days": total_days, "start": start, "end": end, "data": result})
+        if class_group is not None:
+            students = students.filter(class_group_id=class_group)
+        if department is not None:
+            students = students.filter(department_id=department)
+        if batch is not None:
+            students = students.filter(batch_id=batch)
+        # values() before the Count groups by these columns only, never the encoding blob
+        ranking = (
+            students.annotate(period=FilteredRelation("attendance", condition=attended))
+            .values("id", "roll_no", "name", "class_group__name")
+            .annotate(presents=Count("period"))
+            .annotate(absences=ExpressionWrapper(Value(len(working)) - F("presents"), output_field=IntegerField()))
+            .order_by("-absences", "roll_no")
+        )
+        if top is not None:
+            ranking = ranking[:max(top, 0)]
+
+        paginator = AbsencePagination()
+        page = paginator.paginate_queryset(ranking, request, view=self)
+        data = [
+            {
+                "roll_no": row["roll_no"],
+                "name": row["name"],
+                "class": row["class_group__name"],
+                "presents": row["presents"],
+                "absences": row["absences"],
+            }
+            for row in page
+        ]
+        return Response({
+            "period_days": (end - start).days + 1,
+            "working_days": len(working),
+            "start": start,
+            "end": end,
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "data": data,
+        })
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+EXPORT_HEADER = ["Date", "Roll No", "Name", "Class", "Department", "Time", "Status", "Present"]
+
 
 class ExportAttendanceExcelAPIView(APIView):
+    """
+    GET /api/attendance/export/
+    Attendance rows of a period as a spreadsheet.
+
+    Query params: days (default 7) or start/end (YYYY-MM-DD); class_group,
+    department; file_format=xlsx (default) or csv (not "format", which DRF
+    reserves for choosing a renderer).
+
+    Rows are read with values_list().iterator() in chunks, never as model
+    instances. CSV is streamed while it is generated; XLSX is written by
+    openpyxl in write-only mode to a temporary file and streamed from there,
+    so worker memory stays flat however long the range.
+    """
+    chunk_size = 2000
+
     def get(self, request):
-        days = int(request.query_params.get("days", 7))
-        end = timezone.localdate()
-        start = end - timedelta(days=days-1)
-        qs = Attendance.objects.filter(date__range=(start, end)).select_related('student','student__class_group')
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.append(["Date","Roll No","Name","Class","Present"])
-        for a in qs.order_by('date'):
-            ws.append([a.date.isoformat(), a.student.roll_no, a.student.name, a.student.class_group and a.student.class_group.name or "", bool(a.status)])
-        resp = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        resp['Content-Disposition'] = f'attachment; filename=attendance_{start}_{end}.xlsx'
-        wb.save(resp)
-        return resp
+        params = request.query_params
+        try:
+            start, end = _date_range(params)
+            class_group = _int_param(params, "class_group")
+            department = _int_param(params, "department")
+        except ValueError:
+            return Response({"error": "Invalid parameters. Use YYYY-MM-DD dates, a positive days and numeric ids."}, status=400)
+        export_format = params.get("file_format", "xlsx")
+        if export_format not in ("xlsx", "csv"):
+            return Response({"error": "file_format must be xlsx or csv"}, status=400)
+
+        qs = Attendance.objects.filter(date__range=(start, end))
+        if class_group is not None:
+            qs = qs.filter(student__class_group_id=class_group)
+        if department is not None:
+            qs = qs.filter(student__department_id=department)
+        rows = qs.order_by("date", "student__roll_no").values_list(
+            "date", "student__roll_no", "student__name",
+            "student__class_group__name", "student__department__name",
+            "time", "status",
+        )
+        filename = f"attendance_{start}_{end}.{export_format}"
+
+        if export_format == "csv":
+            writer = csv.writer(_Echo())
+            lines = itertools.chain(
+                [writer.writerow(EXPORT_HEADER)],
+                (writer.writerow(self.export_row(row)) for row in rows.iterator(chunk_size=self.chunk_size)),
+            )
+            resp = StreamingHttpResponse(lines, content_type="text/csv")
+            resp["Content-Disposition"] = f"attachment; filename={filename}"
+            return resp
+
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Attendance")
+        ws.append(EXPORT_HEADER)
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            ws.append(self.export_row(row))
+        tmp = tempfile.TemporaryFile()
+        wb.save(tmp)
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=filename,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    @staticmethod
+    def export_row(row):
+        day, roll_no, name, class_name, department, at, status_value = row
+        return [
+            day.isoformat(),
+            roll_no,
+            name,
+            class_name or "",
+            department or "",
+            at.strftime("%H:%M:%S") if at else "",
+            status_value,
+            "Yes" if status_value in ("on_time", "late") else "No",
+        ]
 
 from rest_framework import status
 from django.db.models import Q
 from rest_framework import generics
 from .serializers import AttendanceSerializer
 
+class RecordCursorPagination(pagination.CursorPagination):
+    """Newest-first attendance records of one student (unique per date).
+    Opt-in like RosterCursorPagination: all records unless page_size is sent."""
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = "-date"
+
+
 class StudentAttendanceDetail(APIView):
     """
     Returns attendance stats and records for a student.
     Query params:
       - date_from (YYYY-MM-DD, optional)
       - date_to (YYYY-MM-DD, optional)
+      - page_size / cursor (optional: page the records, newest first; follow "next")
+
+    Five queries however long the history: the student, the working-day
+    calendar (2), one conditional aggregate for first/last date and the
+    present / on-time / late counts, and the records (one page of them when
+    page_size is given, for multi-year histories). Absent days
+    are the working days of the period minus the days present.
     """
     def get(self, request, roll_no):
         date_from = request.GET.get("date_from")
@@ -323,41 +785,40 @@ class StudentAttendanceDetail(APIView):
         except ValueError:
             return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
 
-        if start is None or end is None:
-            if qs.exists():
-                start = qs.order_by("date").first().date
-                end = qs.order_by("-date").first().date
-
-        # Build date range and counts
-        all_dates = []
+        calendar = working_days.WorkingCalendar(start, end)
+        present = Q(status__in=("on_time", "late"))
+        off_days = calendar.off_days_q()
+        stats = qs.aggregate(
+            first_date=Min("date"),
+            last_date=Max("date"),
+            present_days=Count("id", filter=present),
+            on_time_days=Count("id", filter=Q(status="on_time")),
+            late_days=Count("id", filter=Q(status="late")),
+            # Presences on holidays/weekly offs must not cancel out absences
+            present_working_days=Count("id", filter=present & ~off_days if off_days else present),
+        )
+        # Without explicit bounds the period is the span of the student's records
+        start = start or stats["first_date"]
+        end = end or stats["last_date"]
+
+        total_days = absent_days = 0
         if start and end and end >= start:
-            delta = (end - start).days
-            all_dates = [start + timedelta(days=i) for i in range(delta + 1)]
-
-        present_days = qs.count()
-        present_dates = set(qs.values_list("date", flat=True))
-        absent_days = len([d for d in all_dates if d not in present_dates]) if all_dates else 0
-        total_days = len(all_dates) if all_dates else present_days
-
-        # Status breakdown - now use the status field directly from model
-        status_counts = {"on_time": 0, "late": 0}
-
-        for att in qs:
-            if att.status == "on_time":
-                status_counts["on_time"] += 1
-            elif att.status == "late":
-                status_counts["late"] += 1
+            total_days = len(calendar.split(start, end)[0])
+            absent_days = max(0, total_days - stats["present_working_days"])
 
         # Build records with id field for editing
+        paginator = RecordCursorPagination()
+        record_rows = qs.values("id", "date", "time", "status").order_by("-date")
+        page = paginator.paginate_queryset(record_rows, request, view=self)
         records = [
             {
-                "id": a.id,
-                "attendanceId": a.id,  # alias for compatibility
-                "date": a.date.isoformat(),
-                "time": (a.time.isoformat() if a.time else None),
-                "status": a.status,
+                "id": a["id"],
+                "attendanceId": a["id"],  # alias for compatibility
+                "date": a["date"].isoformat(),
+                "time": (a["time"].isoformat() if a["time"] else None),
+                "status": a["status"],
             }
-            for a in qs.order_by("-date")
+            for a in (page if page is not None else record_rows)
         ]
 
         return Response({
@@ -366,16 +827,18 @@ class StudentAttendanceDetail(APIView):
             "class": student.class_group.name if student.class_group else None,
             "batch": student.batch.name if student.batch else None,
             "department": student.department.name if student.department else None,
-            "present_days": present_days,
+            "present_days": stats["present_days"],
             "absent_days": absent_days,
-            "on_time_days": status_counts["on_time"],
-            "late_days": status_counts["late"],
+            "on_time_days": stats["on_time_days"],
+            "late_days": stats["late_days"],
             "total_days": total_days,
             "records": records,
+            "next": paginator.get_next_link() if page is not None else None,
+            "previous": paginator.get_previous_link() if page is not None else None,
         })
 
 class AttendanceUpdateAPIView(generics.RetrieveUpdateAPIView):
-    queryset = Attendance.objects.all()
+    queryset = Attendance.objects.select_related('student')
     serializer_class = AttendanceSerializer
     lookup_field = "pk"
     
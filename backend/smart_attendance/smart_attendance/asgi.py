@@ -2,6 +2,8 @@
 ASGI config for smart_attendance project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; the streaming check-in websocket is served directly
+(run with an ASGI server, e.g. ``uvicorn smart_attendance.asgi:application``).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -12,5 +14,26 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_attendance.settings')
+# This process serves requests: warm the face models at boot (see attendance.apps)
+os.environ.setdefault('FACE_SERVING_PROCESS', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup: the handler uses the ORM
+from attendance.streaming import stream_checkin  # noqa: E402
+
+WEBSOCKET_ROUTES = {
+    "/ws/attendance/stream/": stream_checkin,
+}
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        path = scope["path"] if scope["path"].endswith("/") else scope["path"] + "/"
+        handler = WEBSOCKET_ROUTES.get(path)
+        if handler is None:
+            await receive()
+            await send({"type": "websocket.close", "code": 4404})
+            return
+        return await handler(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -154,3 +154,109 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Face recognition
+# Maximum euclidean distance between two encodings still treated as the same
+# person (face_recognition's default tolerance).
+FACE_MATCH_TOLERANCE = 0.6
+
+# Uploads larger than this (longest side, px) are decoded at reduced resolution
+# (JPEG DCT scaling); landmarks and encodings are computed on this frame.
+FACE_DECODE_MAX_SIDE = int(os.environ.get("FACE_DECODE_MAX_SIDE", 1280))
+# HOG face detection runs on a copy downscaled to this longest side; boxes are
+# mapped back to the decoded frame. Faces must stay ~80px in this copy.
+FACE_DETECTION_MAX_SIDE = int(os.environ.get("FACE_DETECTION_MAX_SIDE", 640))
+
+# Face detection/encoding runs in a persistent process pool (per web worker) so
+# request threads never run dlib inline. 0 runs jobs inline in the request.
+FACE_WORKER_PROCESSES = int(os.environ.get("FACE_WORKER_PROCESSES", 2))
+# Jobs allowed to wait for a free process before requests get a 503.
+FACE_WORKER_QUEUE_SIZE = int(os.environ.get("FACE_WORKER_QUEUE_SIZE", 16))
+# Seconds a view waits for a face job before answering 504.
+FACE_WORKER_TIMEOUT = float(os.environ.get("FACE_WORKER_TIMEOUT", 10))
+
+# Load and warm the face models (in every pool process) when a web worker
+# boots, so /api/health/ready/ only reports ready once check-ins are fast.
+# Don't combine with gunicorn --preload: the warm-up thread would not survive fork.
+FACE_WARMUP_ON_BOOT = os.environ.get("FACE_WARMUP_ON_BOOT", "1") == "1"
+
+# Set by wsgi.py / asgi.py: only web server processes warm up the models and
+# start the face pool at boot (runserver is detected separately).
+FACE_SERVING_PROCESS = os.environ.get("FACE_SERVING_PROCESS") == "1"
+
+# Confident check-ins (distance at or below this) are kept as extra reference
+# encodings, up to FACE_MAX_CHECKIN_REFERENCES per student (oldest dropped).
+FACE_REFERENCE_TOPUP_DISTANCE = 0.4
+FACE_MAX_CHECKIN_REFERENCES = 5
+
+# Persistent face data (ANN index centroids, encoding store) shared by workers.
+FACE_DATA_DIR = os.environ.get("FACE_DATA_DIR", os.path.join(BASE_DIR, "face_data"))
+# Galleries with at least this many rows are searched through the IVF index;
+# smaller ones use an exact full scan. NPROBE trades recall for latency.
+FACE_ANN_MIN_SIZE = int(os.environ.get("FACE_ANN_MIN_SIZE", 5000))
+FACE_ANN_NPROBE = int(os.environ.get("FACE_ANN_NPROBE", 8))
+# Row format of the memory-mapped encoding store: "float32" or "int8"
+# (per-row scale, a quarter of the float32 footprint).
+FACE_STORE_DTYPE = os.environ.get("FACE_STORE_DTYPE", "float32")
+# Student changes within this many seconds are published as one store version
+# (0 = publish on every save). Superseded versions are deleted after
+# RETAIN_SECONDS so workers that just read CURRENT can still map them.
+FACE_STORE_PUBLISH_DELAY = float(os.environ.get("FACE_STORE_PUBLISH_DELAY", 1.0))
+FACE_STORE_RETAIN_SECONDS = int(os.environ.get("FACE_STORE_RETAIN_SECONDS", 300))
+
+# Encodings of recently submitted images, keyed by a hash of the bytes, so a
+# resubmitted frame skips dlib. PHASH_DISTANCE > 0 also matches near-duplicate
+# frames within that many bits of a 64-bit difference hash (off by default).
+FACE_CACHE_MAX_ENTRIES = int(os.environ.get("FACE_CACHE_MAX_ENTRIES", 512))
+FACE_CACHE_TTL = int(os.environ.get("FACE_CACHE_TTL", 300))
+FACE_CACHE_PHASH_DISTANCE = int(os.environ.get("FACE_CACHE_PHASH_DISTANCE", 0))
+
+# Quality gate run before dlib: frames are rejected with a reason code when
+# blurry (Laplacian variance of a 320px grayscale copy), badly exposed (mean
+# gray level) or when the detected face is smaller than MIN_FACE_SIZE px.
+FACE_QUALITY_GATE = os.environ.get("FACE_QUALITY_GATE", "1") == "1"
+FACE_MIN_SHARPNESS = float(os.environ.get("FACE_MIN_SHARPNESS", 60))
+FACE_MIN_BRIGHTNESS = 40
+FACE_MAX_BRIGHTNESS = 220
+FACE_MIN_FACE_SIZE = int(os.environ.get("FACE_MIN_FACE_SIZE", 80))
+
+# Streaming check-in (ws /ws/attendance/stream/, ASGI only): seconds a kiosk
+# connection may keep sending frames before it is closed without a match.
+FACE_STREAM_MAX_SECONDS = int(os.environ.get("FACE_STREAM_MAX_SECONDS", 30))
+
+# Concurrent check-ins are encoded together: the first image waits up to
+# BATCH_WINDOW_MS for others (at most BATCH_MAX_SIZE) and the batch goes to the
+# face worker as one job with a single descriptor call. 1 disables batching.
+FACE_BATCH_MAX_SIZE = int(os.environ.get("FACE_BATCH_MAX_SIZE", 8))
+FACE_BATCH_WINDOW_MS = float(os.environ.get("FACE_BATCH_WINDOW_MS", 5))
+
+# Classroom photo attendance (/api/attendance/class-photo/): group photos are
+# decoded/searched at higher resolution than kiosk frames so back-row faces
+# (at least MIN_FACE_SIZE px) are found. Faces whose two nearest students are
+# closer than AMBIGUITY_MARGIN are reported instead of marked.
+FACE_CLASS_PHOTO_DECODE_MAX_SIDE = int(os.environ.get("FACE_CLASS_PHOTO_DECODE_MAX_SIDE", 3200))
+FACE_CLASS_PHOTO_DETECTION_MAX_SIDE = int(os.environ.get("FACE_CLASS_PHOTO_DETECTION_MAX_SIDE", 1600))
+FACE_CLASS_PHOTO_MIN_FACE_SIZE = 40
+FACE_CLASS_PHOTO_AMBIGUITY_MARGIN = 0.05
+FACE_CLASS_PHOTO_MAX_IMAGES = 5
+FACE_CLASS_PHOTO_TIMEOUT = float(os.environ.get("FACE_CLASS_PHOTO_TIMEOUT", 60))
+
+# Kiosks registered with a location/timetable only search their current
+# class's (or department's/batch's) students. Shards are rebuilt after
+# SHARD_TTL seconds; classes starting within PREWARM_MINUTES are built ahead
+# of time by a background thread, and timetable slots count from
+# EARLY_MINUTES before their start.
+FACE_SHARD_PREWARM = os.environ.get("FACE_SHARD_PREWARM", "1") == "1"
+FACE_SHARD_PREWARM_MINUTES = 10
+FACE_SHARD_PREWARM_INTERVAL = 60
+FACE_SHARD_EARLY_MINUTES = 15
+FACE_SHARD_TTL = int(os.environ.get("FACE_SHARD_TTL", 300))
+FACE_SHARD_CACHE_SIZE = 64
+
+# Label of the current encoding pipeline (detector, landmarks, descriptor
+# model, jitters), stored with every encoding. Change it whenever the pipeline
+# changes, then run `manage.py reembed_faces`. While MATCH_SAME_VERSION is on,
+# encodings of other versions are never compared with new ones.
+FACE_ENCODER_VERSION = os.environ.get("FACE_ENCODER_VERSION", "dlib-resnet-v1")
+FACE_MATCH_SAME_VERSION = os.environ.get("FACE_MATCH_SAME_VERSION", "1") == "1"
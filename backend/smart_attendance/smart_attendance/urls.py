@@ -34,11 +34,12 @@ from accounts.views import (
     RegisterStudent,  # <-- expose register/ endpoint
 )
 from attendance.views import (
-    AttendanceStatus, AttendanceStatusList, MarkAttendance,
+    AttendanceStatus, AttendanceStatusList, MarkAttendance, IdentifyAttendance,
+    QRFaceAttendance, ClassPhotoAttendance, ClassSummaryAPIView,
     MostAbsentAPIView, ExportAttendanceExcelAPIView,
     StudentAttendanceDetail, AttendanceUpdateAPIView,
     AdminAuthAPIView, AdminAuthValidateAPIView, AdminPinAPIView,
-    AdminPinResetAPIView,
+    AdminPinResetAPIView, ReadinessAPIView, FaceCacheStatsAPIView,
 )
 
 router = DefaultRouter()
@@ -52,6 +53,12 @@ urlpatterns = [
     path('api/attendanceStatus/', AttendanceStatus.as_view()),
     path('api/attendanceStatus/list/', AttendanceStatusList.as_view()),
     path('api/attendance/', MarkAttendance.as_view()),
+    path('api/attendance/identify/', IdentifyAttendance.as_view()),
+    path('api/attendance/qr-face/', QRFaceAttendance.as_view()),
+    path('api/attendance/class-photo/', ClassPhotoAttendance.as_view()),
+    path('api/attendance/summary/', ClassSummaryAPIView.as_view()),
+    path('api/attendance/most-absent/', MostAbsentAPIView.as_view()),
+    path('api/attendance/export/', ExportAttendanceExcelAPIView.as_view()),
     path('api/attendance/<int:pk>/', AttendanceUpdateAPIView.as_view()),
     path('api/student/<str:roll_no>/attendance/', StudentAttendanceDetail.as_view()),
     path('api/students/', StudentListView.as_view()),
@@ -71,6 +78,10 @@ urlpatterns = [
     path('api/admin/pin/', AdminPinAPIView.as_view()),
     # DEBUG-only: reset admin PIN to default (remove in production)
     path('api/admin/pin/reset-default/', AdminPinResetAPIView.as_view()),
+
+    # Load balancer readiness probe (face models warmed)
+    path('api/health/ready/', ReadinessAPIView.as_view()),
+    path('api/health/face-cache/', FaceCacheStatsAPIView.as_view()),
 ]
 
 # Serve media files in development
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_attendance.settings')
+# This process serves requests: warm the face models at boot (see attendance.apps)
+os.environ.setdefault('FACE_SERVING_PROCESS', '1')
 
 application = get_wsgi_application()